@@ -1,78 +1,87 @@
+import argparse
+import asyncio
 import cv2
-import numpy as np
-import serial
-import time
+from configuracion import load_settings
+from transporte import open_transport
+from controlador import EmbeddedController
+from camara import Camera
+from procesamiento import FrameProcessor
+from protocolo import encode_result, CODE_CAPTURE_ERROR, CODE_HEALTHY
 
-# Configuración de la comunicación serie con Arduino
-arduino = serial.Serial('COM4', 9600)  # Asegúrate de cambiar 'COM4' al puerto correcto de tu Arduino
-time.sleep(2)  # Espera para asegurarse de que la conexión esté establecida
+# Tabla de deficiencias, cámara y puerto serie compartidos con Sistema.py (configuracion.json).
+# Los rangos de color son los de Hojas ("color_ranges" y "calibration" de configuracion.json), ya calibrados
+# con calibracion.py --program Hojas; se leen en cada hoja para tomar una recarga
+settings = load_settings()
 
-# Define un diccionario con la información de las deficiencias
-deficiency_info = {
-    'Nitrógeno (N)': {
-        'color_range': ([16, 122, 133], [21, 160, 174]),  # HSV range for yellow ([min], [max])
-        'síntomas': 'Clorosis uniforme en las hojas más viejas, senescencia prematura, defoliación, reducción en el crecimiento',
-        'tratamiento': 'Aplicación de fertilizantes ricos en nitrógeno'
-    },
-    'Fósforo (P)': {
-        'color_range': ([141, 38, 102], [175, 101, 255]),  # HSV range for reddish-brown
-        'síntomas': 'Manchas rojizas y marrones, retardo en el crecimiento en plantas jóvenes',
-        'tratamiento': 'Uso de fertilizantes con alto contenido de fósforo'
-    },
-    'Hierro (Fe)': {
-        'color_range': ([15, 38, 162], [24, 76, 194]),  # HSV range for light green to white
-        'síntomas': 'Manchas de color verde claro a blanco en las hojas',
-        'tratamiento': 'Aplicación de quelatos de hierro o fertilizantes foliares con hierro'
-    }
-}
+# Búferes de la clasificación; el controlador clasifica un cuadro a la vez
+frame_processor = FrameProcessor()
 
-# Función para detectar deficiencia
-def detect_deficiency(image):
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    
-    for deficiency, info in deficiency_info.items():
-        lower, upper = info['color_range']
-        lower = np.array(lower, dtype=np.uint8)
-        upper = np.array(upper, dtype=np.uint8)
-        
-        mask = cv2.inRange(hsv, lower, upper)
-        if cv2.countNonZero(mask) > 0:
-            return deficiency, info['síntomas'], info['tratamiento']
-    
-    return None, None, None
+# Deficiencia dominante y su cobertura (fracción de píxeles)
+def classify_frame(image):
+    # Rangos de color nuevos si cambió la configuración o la calibración
+    settings.maybe_reload()
+    classifier = settings.colors('Hojas').classifier
+    breakdown = frame_processor.breakdown(classifier, image)
+    deficiency = classifier.dominant(breakdown)
+    return deficiency, breakdown[deficiency]['coverage'] if deficiency else 0.0
 
-# Función para capturar una imagen con la cámara
-def capture_image():
-    cap = cv2.VideoCapture(3)  # Asegúrate de tener una cámara conectada
-    ret, frame = cap.read()
-    if ret:
-        return frame
-    else:
-        return None
+# Texto completo del resultado; se muestra en la computadora
+def result_text(deficiency):
+    if deficiency:
+        info = settings.colors('Hojas').deficiency_info[deficiency]
+        return f"{deficiency}\nSíntomas: {info['symptoms']}\nTratamiento: {info['treatment']}"
+    return "No se detectó ninguna deficiencia nutricional."
 
-# Inicializa la captura de video
-cap = cv2.VideoCapture(0)
+# Trama binaria (protocolo.py) con el resultado de classify_frame: 11 bytes en lugar del texto completo
+def format_result(result, sequence):
+    deficiency, coverage = result
+    print(result_text(deficiency))
+    return encode_result(sequence, settings.deficiency_code[deficiency] if deficiency else CODE_HEALTHY, coverage)
 
-# Bucle principal
-while True:
-    if arduino.in_waiting > 0:
-        incoming_data = arduino.readline().decode().strip()
-        if incoming_data == 'e':
-            time.sleep(1)  # Espera 1 segundo
-            ret, frame = cap.read()  # Lee el fotograma actual de la cámara
-            if ret:
-                deficiency, síntomas, tratamiento = detect_deficiency(frame)
-                if deficiency:
-                    result_text = f"{deficiency}\nSíntomas: {síntomas}\nTratamiento: {tratamiento}"
-                else:
-                    result_text = "No se detectó ninguna deficiencia nutricional."
-                
-                # Envía la información al Arduino
-                arduino.write(result_text.encode())
-                print(result_text)
-            else:
-                print("Error al capturar la imagen.")
+# Respuesta a un disparo cuya hoja no se pudo capturar o clasificar
+def format_error(sequence):
+    return encode_result(sequence, CODE_CAPTURE_ERROR)
 
-# Libera la captura de video cuando el bucle se cierra
-cap.release()
-cv2.destroyAllWindows()
+# Protocolo anterior: el texto completo por el puerto serie (para firmware que aún no decodifica tramas)
+def format_result_text(result, sequence):
+    text = result_text(result[0])
+    print(text)
+    return text.encode()
+
+def format_error_text(sequence):
+    return "Error al capturar la imagen.".encode()
+
+def main(argv=None):
+    serial_options = settings.serial('Hojas')
+    embedded = settings.embedded
+    parser = argparse.ArgumentParser(description="Detección de deficiencias disparada desde el Arduino")
+    parser.add_argument('port', nargs='?', default=serial_options.get('port', 'COM4'), help="Puerto del Arduino (p. ej. COM4, /dev/ttyUSB0), o 'sim://?interval=1' para un Arduino simulado")
+    parser.add_argument('--camera', default=str(settings.camera('Hojas')), help="Índice de la cámara, o una imagen o video para probar sin cámara")
+    parser.add_argument('--delay', type=float, default=embedded.get('capture_delay', 1.0), help="Segundos entre el disparo y la foto")
+    parser.add_argument('--queue', type=int, default=embedded.get('queue_size', 8), help="Disparos que pueden esperar en cola")
+    parser.add_argument('--texto', action='store_true', help="Enviar el texto completo en lugar de tramas binarias")
+    args = parser.parse_args(argv)
+
+    # Configuración de la comunicación serie con Arduino (el reinicio al conectarse se espera en la primera escritura)
+    arduino = open_transport(args.port, serial_options.get('baudrate', 9600), reset_delay=serial_options.get('reset_delay', 2))
+
+    # Inicializa la captura de video: se abre una vez, se calienta y sigue leyendo en segundo plano
+    cap = Camera(args.camera, **settings.camera_options).open()
+    print(cap.stats())
+
+    # Disparos, captura, clasificación y envío corren como tareas independientes: un disparo 'e'
+    # que llega mientras se procesa la hoja anterior queda en cola en lugar de perderse
+    controller = EmbeddedController(arduino, cap.read, classify_frame, format_result_text if args.texto else format_result,
+                                    embedded.get('trigger', 'e'), args.delay, args.queue, format_error_text if args.texto else format_error)
+    try:
+        asyncio.run(controller.run())
+    except KeyboardInterrupt:
+        print(controller.stats())
+    finally:
+        # Libera la captura de video cuando el bucle se cierra
+        cap.release()
+        arduino.close()
+        cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,11 @@ import cv2
 import numpy as np
 import easygui
 
+from camara import shared_camera, release_cameras
+from configuracion import load_settings
+
+settings = load_settings()
+
 # Variables globales para almacenar los puntos seleccionados
 points = []
 hsv_values = []
@@ -56,16 +61,18 @@ def estimate_hsv():
         input_source = select_input_source()
         
         if input_source == "Capturar desde cámara":
-            cap = cv2.VideoCapture(3)
-            if not cap.isOpened():
+            # La cámara se abre la primera vez y se reutiliza en las siguientes estimaciones
+            try:
+                camera = shared_camera(settings.camera('Prueba', 3), **settings.camera_options)
+            except IOError:
                 print("Error al abrir la cámara")
                 return
 
-            ret, frame = cap.read()
+            ret, frame = camera.latest_frame()
             if not ret:
                 print("Error al capturar el frame")
                 return
-            cap.release()
+            frame = frame.copy()
         
         elif input_source == "Cargar imagen":
             image_path = easygui.fileopenbox(title="Selecciona una imagen", filetypes=[["*.jpg", "*.png", "*.jpeg", "Imágenes"]])
@@ -123,9 +130,8 @@ def estimate_hsv():
             # Permitir ver la transmisión completa con la máscara aplicada
             while True:
                 if input_source == "Capturar desde cámara":
-                    cap = cv2.VideoCapture(3)
-                    while cap.isOpened():
-                        ret, frame = cap.read()
+                    while True:
+                        ret, frame = camera.read()
                         if not ret:
                             break
                         hsv_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
@@ -137,7 +143,6 @@ def estimate_hsv():
                         cv2.imshow('Result', result)
                         
                         if cv2.waitKey(1) & 0xFF == ord('q'):
-                            cap.release()
                             cv2.destroyAllWindows()
                             break
                 elif input_source == "Cargar video":
@@ -177,6 +182,8 @@ def estimate_hsv():
         if easygui.ynbox("¿Quieres realizar otra estimación?", choices=["Sí", "No"]) == False:
             break
 
+    release_cameras()
+
     # Mostrar todos los valores estimados de HSV
     print("Valores estimados de HSV:")
     for i, (lower, upper) in enumerate(hsv_estimates, start=1):
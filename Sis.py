@@ -8,9 +8,14 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
 
+from configuracion import load_settings
+from analisis import find_dark_contour, largest_contour, leaf_area_from_reference
+
+settings = load_settings()
+
 class LiveFeed:
     def __init__(self, root, reference_area_cm2=1):
-        self.cap = cv2.VideoCapture(3)
+        self.cap = cv2.VideoCapture(settings.camera('Sis', 3))
         self.reference_area_cm2 = reference_area_cm2
         self.reference_area_pixels = None
         self.image_counter = 1
@@ -26,15 +31,13 @@ class LiveFeed:
         frame_height, frame_width, _ = frame.shape
         reference_area = frame[frame_height-150:frame_height-50, 50:150]
         gray = cv2.cvtColor(reference_area, cv2.COLOR_BGR2GRAY)
-        _, threshold = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY)
-        contours, _ = cv2.findContours(threshold, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        _, threshold = cv2.threshold(gray, settings.threshold('box_reference_gray', 127), 255, cv2.THRESH_BINARY)
+        max_contour = largest_contour(threshold, settings.threshold('reference_min_area', 100))
         
-        if contours:
-            max_contour = max(contours, key=cv2.contourArea)
-            if cv2.contourArea(max_contour) > 100:
-                cv2.drawContours(reference_area, [max_contour], -1, (0, 255, 255), 2)
-                if self.reference_area_pixels is None:
-                    self.reference_area_pixels = cv2.contourArea(max_contour)
+        if max_contour is not None:
+            cv2.drawContours(reference_area, [max_contour], -1, (0, 255, 255), 2)
+            if self.reference_area_pixels is None:
+                self.reference_area_pixels = cv2.contourArea(max_contour)
         
         cv2.rectangle(frame, (50, frame_height-150), (150, frame_height-50), (0, 0, 255), 2)
         cv2.putText(frame, "Área de referencia", (50, frame_height-160), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
@@ -42,12 +45,9 @@ class LiveFeed:
         return frame
 
     def detect_leaf(self, frame):
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        _, threshold = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV)
-        contours, _ = cv2.findContours(threshold, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        max_contour = find_dark_contour(frame, settings.threshold('leaf_gray', 127))
         
-        if contours:
-            max_contour = max(contours, key=cv2.contourArea)
+        if max_contour is not None:
             cv2.drawContours(frame, [max_contour], -1, (0, 255, 0), 2)
             return frame, max_contour
         
@@ -57,9 +57,7 @@ class LiveFeed:
         if self.reference_area_pixels is None:
             return None
         
-        leaf_area_pixels = cv2.contourArea(leaf_contour)
-        leaf_area_cm2 = (leaf_area_pixels / self.reference_area_pixels) * self.reference_area_cm2
-        return leaf_area_cm2, leaf_area_pixels
+        return leaf_area_from_reference(leaf_contour, self.reference_area_pixels, self.reference_area_cm2)
 
     def save_image_with_metadata(self, frame, leaf_area_cm2, leaf_area_pixels):
         timestamp = datetime.datetime.now()
@@ -1,13 +1,26 @@
+import sys
+import time
 import cv2
-import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
 import tkinter as tk
-from tkinter import Label, Text, Button
+from tkinter import Label, Text
 from PIL import Image, ImageTk
 
-# Load pre-trained model (adjust the path to your model)
-model = load_model('model_weights.weights.h5')
+from configuracion import load_settings
+from inferencia import InferenceService
+from analisis import split_frame_leaf_area
+from modelo import ModelLoader
+from procesamiento import BatchPreprocessor, FrameProcessor
+
+settings = load_settings()
+
+# Pre-trained model (adjust the path in configuracion.json, or pass it as the first argument).
+# It is loaded in the background by ModelLoader when the app starts, not on import:
+# a .onnx or .tflite export starts much faster than the Keras model
+MODEL_FILE = settings.model('SisEmbebido', 'model_weights.weights.h5')
+
+# Model input: side in pixels, and whether it expects RGB (the frames have always been fed as OpenCV's BGR)
+MODEL_INPUT_SIZE = 224
+MODEL_SWAP_RB = False
 
 # Dictionary for deficiencies and recommendations
 deficiency_recommendations = {
@@ -16,32 +29,12 @@ deficiency_recommendations = {
     # Add other mappings based on extracted PDF content
 }
 
-# Function to preprocess image for prediction
-def preprocess_image(img):
-    img_array = cv2.resize(img, (224, 224))
-    img_array = np.expand_dims(img_array, axis=0)
-    img_array = img_array / 255.0
-    return img_array
-
-# Function to predict disease
-def predict_disease(img, model):
-    img_array = preprocess_image(img)
-    predictions = model.predict(img_array)
-    return np.argmax(predictions)
-
-# Function to calculate area using reference object
-def calculate_area(leaf_contour, reference_contour, reference_cm2):
-    ref_area_pixels = cv2.contourArea(reference_contour)
-    leaf_area_pixels = cv2.contourArea(leaf_contour)
-    leaf_area_cm2 = (leaf_area_pixels / ref_area_pixels) * reference_cm2
-    return leaf_area_cm2
-
 # Initialize GUI
 class PlantDiseaseDetectorApp:
     def __init__(self, root, model):
         self.root = root
         self.model = model
-        self.video_capture = cv2.VideoCapture(0)
+        self.video_capture = cv2.VideoCapture(settings.camera('SisEmbebido', 0))
         self.root.title("Plant Disease Detector")
         
         # Video display
@@ -57,6 +50,20 @@ class PlantDiseaseDetectorApp:
         self.disease_label.pack()
         self.recommendation_text = Text(root, height=10, width=50)
         self.recommendation_text.pack()
+        self.stats_label = Label(root, text="")
+        self.stats_label.pack()
+        
+        # The model runs on a worker thread in batches; the UI only shows its latest result.
+        # predict_on_batch skips the per-call setup of model.predict, and waits until the model is loaded
+        self.disease_label.config(text=f"Detected Disease: {model.status()}")
+        # Frames are resized and normalized straight into a reused float32 batch
+        self.preprocessor = BatchPreprocessor(MODEL_INPUT_SIZE, swap_rb=MODEL_SWAP_RB)
+        self.inference = InferenceService(self.preprocessor, model.predict_on_batch).start()
+        # Reused buffer for the BGR->RGB display copy
+        self.frame_processor = FrameProcessor()
+        self.display_seconds = 0.0
+        self.last_inference = 0
+        self.frame_count = 0
         
         # Update video feed
         self.update_video()
@@ -66,43 +73,50 @@ class PlantDiseaseDetectorApp:
         if ret:
             # Split the frame to get leaf and reference areas
             height, width = frame.shape[:2]
-            reference_area = frame[:, :width//4]
             leaf_area = frame[:, width//4:]
             
-            # Process the leaf area for disease detection
-            disease_class = predict_disease(leaf_area, self.model)
-            deficiency, recommendation = get_recommendation(disease_class)
-            
-            # Display disease and recommendation
-            self.disease_label.config(text=f"Detected Disease: {deficiency}")
-            self.recommendation_text.delete(1.0, tk.END)
-            self.recommendation_text.insert(tk.END, recommendation)
-            
-            # Process the reference area for area calculation
-            gray_ref = cv2.cvtColor(reference_area, cv2.COLOR_BGR2GRAY)
-            _, thresh_ref = cv2.threshold(gray_ref, 128, 255, cv2.THRESH_BINARY_INV)
-            contours_ref, _ = cv2.findContours(thresh_ref, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            # Send the leaf area for disease detection; the text is only updated when there is a new result
+            self.inference.submit(leaf_area)
+            latest = self.inference.latest_result(self.last_inference)
+            if latest is not None:
+                self.last_inference, result = latest
+                deficiency, recommendation = get_recommendation(result['class'])
+                
+                # Display disease and recommendation
+                self.disease_label.config(text=f"Detected Disease: {deficiency}")
+                self.recommendation_text.delete(1.0, tk.END)
+                self.recommendation_text.insert(tk.END, recommendation)
             
-            gray_leaf = cv2.cvtColor(leaf_area, cv2.COLOR_BGR2GRAY)
-            _, thresh_leaf = cv2.threshold(gray_leaf, 128, 255, cv2.THRESH_BINARY_INV)
-            contours_leaf, _ = cv2.findContours(thresh_leaf, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            self.frame_count += 1
+            if self.frame_count % 30 == 0:
+                if self.model.error is not None and self.inference.running:
+                    # Without a model the area is still measured; classification stays off
+                    self.inference.stop()
+                    self.disease_label.config(text=f"Detected Disease: {self.model.status()}")
+                stats = self.inference.stats()
+                preprocess = self.preprocessor.stats()
+                preprocess_ms = f"{preprocess['preprocess_ms_mean']:.1f}" if preprocess['frames'] else "-"
+                self.stats_label.config(text=f"{self.model.status()} | {stats['inferences_per_s']:.1f} inferences/s | skipped (unchanged) {stats['skipped']} | dropped {stats['dropped']}\n"
+                                             f"preprocess {preprocess_ms} ms/frame | display {self.display_seconds / self.frame_count * 1000:.1f} ms/frame | "
+                                             f"buffer allocations {preprocess['allocations'] + self.frame_processor.allocations}")
             
-            if contours_ref and contours_leaf:
-                ref_contour = max(contours_ref, key=cv2.contourArea)
-                leaf_contour = max(contours_leaf, key=cv2.contourArea)
-                leaf_area_cm2 = calculate_area(leaf_contour, ref_contour, 1.0)  # Assuming 1 cm^2 reference
+            # Reference (left quarter) and leaf areas, measured by the shared analysis core (analisis.py)
+            leaf_area_cm2 = split_frame_leaf_area(frame, settings.threshold('model_gray', 128), 1.0)  # Assuming 1 cm^2 reference
+            if leaf_area_cm2 is not None:
                 self.area_label.config(text=f"Leaf Area: {leaf_area_cm2:.2f} cm^2")
             
-            # Display video
-            combined_frame = np.hstack((reference_area, leaf_area))
-            img = Image.fromarray(cv2.cvtColor(combined_frame, cv2.COLOR_BGR2RGB))
+            # Display video: the reference and leaf areas are views of the same frame, so it is shown as is
+            start = time.perf_counter()
+            img = Image.fromarray(self.frame_processor.rgb(frame))
             imgtk = ImageTk.PhotoImage(image=img)
             self.video_label.imgtk = imgtk
             self.video_label.configure(image=imgtk)
+            self.display_seconds += time.perf_counter() - start
         
         self.root.after(10, self.update_video)
     
     def __del__(self):
+        self.inference.stop()
         self.video_capture.release()
 
 # Function to get recommendation based on disease class
@@ -112,6 +126,7 @@ def get_recommendation(disease_class):
 
 # Run the application
 if __name__ == "__main__":
+    model = ModelLoader(sys.argv[1] if len(sys.argv) > 1 else MODEL_FILE).start()
     root = tk.Tk()
     app = PlantDiseaseDetectorApp(root, model)
     root.mainloop()
@@ -4,47 +4,92 @@
 import cv2
 import numpy as np
 import pandas as pd
+import argparse
+import bisect
 import datetime
 import os
 import shutil
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
-import serial
+import threading
 import time
-
-# Configuración de la comunicación serie con Arduino
-# arduino = serial.Serial('COM3', 9600)  # Asegúrate de cambiar 'COM3' al puerto correcto de tu Arduino
-time.sleep(13)  # Espera para asegurarse de que la conexión esté establecida
-
-# Define un diccionario con la información de las deficiencias
-deficiency_info = {
-    'Nitrógeno (N)': {
-        'color_range': ([20, 143, 112], [23, 179, 137]),  # HSV range for yellow ([min], [max])
-        'symptoms': 'Clorosis uniforme en las hojas más viejas, senescencia prematura, defoliación, reducción en el crecimiento',
-        'treatment': 'Aplicación de fertilizantes ricos en nitrógeno'
-    },
-    'Fósforo (P)': {
-        'color_range': ([153, 22, 115], [167, 134, 169]),  # HSV range for reddish-brown
-        'symptoms': 'Manchas rojizas y marrones, retardo en el crecimiento en plantas jóvenes',
-        'treatment': 'Uso de fertilizantes con alto contenido de fósforo'
-    },
-    'Hierro (Fe)': {
-        'color_range': ([23, 37, 118], [32, 124, 162]),  # HSV range for light green to white
-        'symptoms': 'Manchas de color verde claro a blanco en las hojas',
-        'treatment': 'Aplicación de quelatos de hierro o fertilizantes foliares con hierro'
-    }
-}
+from configuracion import load_settings
+from analisis import DATA_COLUMNS, LeafAnalyzer, annotate, deficiency_result
+from captura import CapturePipeline, DROP_OLDEST
+from registro import ResultsStore, leaf_filename
+from visor import ImageCache
+from transporte import open_transport
+from camara import Camera
+from procesos import ProcessAnalysisPool
+from escritura import ImageWriter
+from protocolo import encode_result, CODE_HEALTHY, CODE_NO_LEAF, CODE_NO_REFERENCE
+
+# Comunicación serie con Arduino: se abre en __main__ sólo si se indica un puerto
+# (p. ej. python Sistema.py COM3, o 'sim://?trigger=P&interval=5' para simularlo)
+arduino = None
+# Con --texto se envían los mensajes de 16 caracteres del LCD, para firmware que aún no decodifica tramas
+text_mode = False
+
+# Resultado de una hoja en una trama binaria de protocolo.py (el texto de síntomas y tratamiento se queda aquí)
+def send_result(sequence, code, coverage=0.0, leaf_area_cm2=None):
+    if arduino is not None:
+        arduino.write(result_text(code).encode() if text_mode else encode_result(sequence, code, coverage, leaf_area_cm2))
+
+# Protocolo anterior: el mensaje del LCD que corresponde a cada código
+def result_text(code):
+    if code == CODE_HEALTHY:
+        return "Hoja sana\n"
+    if code == CODE_NO_REFERENCE:
+        return "No se detecto el\narea de referenc"
+    if code == CODE_NO_LEAF:
+        return "No se detecto la\nhoja"
+    deficiency = next((name for name, value in settings.deficiency_code.items() if value == code), None)
+    return f"Deficiencia:\n{deficiency}"
+
+# Configuración compartida (configuracion.json): cámara, puerto serie y recarga de los rangos de color.
+# La tabla de deficiencias, la detección y la medición están en analisis.py (sin interfaz)
+settings = load_settings()
 
 class LiveFeed:
-    def __init__(self, root, reference_area_cm2=1):
-        self.cap = cv2.VideoCapture(3)
+    # queue_size y drop_policy controlan la cola entre el hilo de captura y el de procesamiento
+    # reference_interval: cada cuántos cuadros se vuelve a medir el cuadro de referencia
+    # camera: índice de la cámara, o una imagen o video (camara.py); por defecto, el de configuracion.json
+    # image_format: formato de las capturas ('png' o 'jpg'); se escriben en segundo plano (escritura.py)
+    # multi_leaf: detectar y medir todas las hojas del cuadro (una fila por hoja) en lugar de sólo la más grande
+    # detection_scale: escala a la que se busca la hoja en la vista previa (None: automática, 1.0: resolución completa);
+    #                  al capturar, el contorno se refina a resolución completa
+    # analysis_workers: procesos de análisis (procesos.py); 0 analiza en el hilo de procesamiento, como antes.
+    #                   Por defecto, "analysis.workers" de configuracion.json
+    def __init__(self, root, reference_area_cm2=1, queue_size=1, drop_policy=DROP_OLDEST, reference_interval=15, camera=None, image_format='png', multi_leaf=False, detection_scale=None, analysis_workers=None):
+        self.cap = Camera(settings.camera('Sistema', 3) if camera is None else camera, **settings.camera_options).open()
+        # Referencia, búferes y detección del hilo de procesamiento
+        self.analyzer = LeafAnalyzer(reference_area_cm2, reference_interval, multi_leaf, detection_scale)
+        if analysis_workers is None:
+            analysis_workers = settings.analysis.get('workers', 0)
+        self.analysis_pool = None
+        if analysis_workers > 0:
+            # Los trabajadores arrancan ya (tardan en importar OpenCV); el anillo se crea con el primer cuadro
+            self.analysis_pool = ProcessAnalysisPool(analysis_workers, reference_area_cm2=reference_area_cm2, reference_interval=reference_interval,
+                                                     multi_leaf=multi_leaf, detection_scale=detection_scale)
+            ret, frame = self.cap.latest_frame()
+            if ret:
+                self.analysis_pool.start(frame.shape, frame.dtype)
+        self.capture_lock = threading.Lock()
+        self.image_writer = ImageWriter(image_format=image_format)
         self.reference_area_cm2 = reference_area_cm2
         self.reference_area_pixels = None
         self.image_counter = 1
-        self.data = []
+        self.stores = {}
         self.create_new_session()
         self.create_gui(root)
+        # Las capturas se guardan aparte en el pipeline: un cuadro posterior no las reemplaza antes de que Tk las lea
+        self.pipeline = CapturePipeline(self.cap.read, self.analyze_frame, queue_size, drop_policy, workers=max(1, analysis_workers),
+                                        keep=lambda result: result['capturing'])
+        self.last_sequence = 0
+        self.displayed_frames = 0
+        self.result_sequence = 0
+        self.pipeline.start()
         self.update_frame()
 
     def create_new_session(self):
@@ -52,148 +97,164 @@ class LiveFeed:
         self.trash_folder = os.path.join(self.session_folder, "trash")
         os.makedirs(self.session_folder, exist_ok=True)
         os.makedirs(self.trash_folder, exist_ok=True)
-        self.excel_filename = os.path.join(self.session_folder, f"leaf_data_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
-        # Crear archivo Excel vacío
-        pd.DataFrame(columns=['Filename', 'Reference Area (pixels)', 'Reference Area (cm^2)', 'Leaf Area (pixels)', 'Leaf Area (cm^2)', 'Deficiency', 'Symptoms', 'Treatment', 'Date', 'Time', 'Researcher']).to_excel(self.excel_filename, index=False)
-
-    def process_frame(self, frame):
-        frame_height, frame_width, _ = frame.shape
-        reference_area = frame[frame_height-150:frame_height-50, 50:150]
-        gray = cv2.cvtColor(reference_area, cv2.COLOR_BGR2GRAY)
-        _, threshold = cv2.threshold(gray, 50, 255, cv2.THRESH_BINARY_INV)
-        contours, _ = cv2.findContours(threshold, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        reference_detected = False
-        if contours:
-            max_contour = max(contours, key=cv2.contourArea)
-            if cv2.contourArea(max_contour) > 100:
-                cv2.drawContours(reference_area, [max_contour], -1, (0, 255, 255), 2)
-                if self.reference_area_pixels is None:
-                    self.reference_area_pixels = cv2.contourArea(max_contour)
-                reference_detected = True
-
-        cv2.rectangle(frame, (50, frame_height-150), (150, frame_height-50), (0, 0, 255), 2)
-        reference_text = "Referencia detectada" if reference_detected else "Referencia NO detectada"
-        cv2.putText(frame, reference_text, (50, frame_height-160), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-        
-        return frame, reference_detected
+        data_name = f"leaf_data_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.excel_filename = os.path.join(self.session_folder, f"{data_name}.xlsx")
+        # Los resultados se agregan a un CSV; el Excel se exporta al terminar la sesión
+        self.store = ResultsStore(os.path.join(self.session_folder, f"{data_name}.csv"), DATA_COLUMNS)
+        self.stores[os.path.abspath(self.session_folder)] = self.store
 
-    def detect_leaf(self, frame):
-        blurred = cv2.GaussianBlur(frame, (5, 5), 0)
-        gray = cv2.cvtColor(blurred, cv2.COLOR_BGR2GRAY)
-        _, threshold = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-        edged = cv2.Canny(threshold, 50, 150)
-        
-        kernel = np.ones((5, 5), np.uint8)
-        morphed = cv2.morphologyEx(edged, cv2.MORPH_CLOSE, kernel)
-        
-        contours, _ = cv2.findContours(morphed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        leaf_detected = False
-        if contours:
-            max_contour = max(contours, key=cv2.contourArea)
-            cv2.drawContours(frame, [max_contour], -1, (0, 255, 0), 2)
-            leaf_detected = True
-        
-        if leaf_detected:
-            cv2.putText(frame, "Hoja detectada", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-        
-        return frame, max_contour if leaf_detected else None
+    def data_row(self, filename, timestamp, leaf_area_cm2, leaf_area_pixels, deficiency, symptoms, treatment):
+        return [filename, self.reference_area_pixels, self.reference_area_cm2, leaf_area_pixels, leaf_area_cm2, deficiency if deficiency else '-', symptoms if symptoms else '-', treatment if treatment else '-', timestamp.strftime('%Y-%m-%d'), timestamp.strftime('%H:%M:%S'), 'Diego Ramos']
 
-    def calculate_leaf_area(self, leaf_contour):
-        if self.reference_area_pixels is None:
-            return None
-        
-        leaf_area_pixels = cv2.contourArea(leaf_contour)
-        leaf_area_cm2 = (leaf_area_pixels / self.reference_area_pixels) * self.reference_area_cm2
-        return leaf_area_cm2, leaf_area_pixels
+    def capture_filename(self, timestamp):
+        return f"hoja_{self.image_counter}_{timestamp.strftime('%Y%m%d_%H%M%S')}{self.image_writer.extension}"
 
     def save_image_with_metadata(self, frame, leaf_area_cm2, leaf_area_pixels, deficiency, symptoms, treatment):
         timestamp = datetime.datetime.now()
-        filename = f"hoja_{self.image_counter}_{timestamp.strftime('%Y%m%d_%H%M%S')}.png"
-        filepath = os.path.join(self.session_folder, filename)
+        filename = self.capture_filename(timestamp)
+        row = self.data_row(filename, timestamp, leaf_area_cm2, leaf_area_pixels, deficiency, symptoms, treatment)
+        self.save_capture(frame, filename, [row], dict(zip(DATA_COLUMNS, row)))
 
-        frame_height, frame_width, _ = frame.shape
-        black_bar = np.zeros((200, frame_width, 3), dtype=np.uint8)
-        cv2.putText(black_bar, f"Filename: {filename}", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        cv2.putText(black_bar, f"Reference Area: {self.reference_area_pixels:.2f} pixels, {self.reference_area_cm2} cm^2", (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        cv2.putText(black_bar, f"Leaf Area: {leaf_area_pixels:.2f} pixels, {leaf_area_cm2:.2f} cm^2", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        cv2.putText(black_bar, f"Date: {timestamp.strftime('%Y-%m-%d')}", (10, 80), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        cv2.putText(black_bar, f"Time: {timestamp.strftime('%H:%M:%S')}", (10, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        cv2.putText(black_bar, f"Researcher: Diego Ramos", (10, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        if deficiency:
-            cv2.putText(black_bar, f"Deficiency: {deficiency}", (10, 140), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            cv2.putText(black_bar, f"Symptoms: {symptoms}", (10, 160), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            cv2.putText(black_bar, f"Treatment: {treatment}", (10, 180), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        else:
-            cv2.putText(black_bar, f"Status: Hoja sana", (10, 140), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    # Una imagen con varias hojas: una fila por hoja ("<imagen>#1", "<imagen>#2", ...)
+    def save_leaves_with_metadata(self, frame, leaves):
+        timestamp = datetime.datetime.now()
+        filename = self.capture_filename(timestamp)
+        rows = [self.data_row(leaf_filename(filename, number), timestamp, leaf['area_cm2'], leaf['area_pixels'], *deficiency_result(leaf['deficiency']))
+                for number, leaf in enumerate(leaves, start=1)]
+        self.save_capture(frame, filename, rows, [dict(zip(DATA_COLUMNS, row)) for row in rows])
 
-        frame_with_metadata = np.vstack((frame, black_bar))
-        cv2.imwrite(filepath, frame_with_metadata)
-        
-        self.data.append([filename, self.reference_area_pixels, self.reference_area_cm2, leaf_area_pixels, leaf_area_cm2, deficiency if deficiency else '-', symptoms if symptoms else '-', treatment if treatment else '-', timestamp.strftime('%Y-%m-%d'), timestamp.strftime('%H:%M:%S'), 'Diego Ramos'])
+    def save_capture(self, frame, filename, rows, metadata):
+        filepath = os.path.join(self.session_folder, filename)
+        # Los datos van dentro del archivo (no dibujados sobre la imagen); la codificación y la escritura
+        # ocurren en segundo plano y el visor recibe la imagen que ya está en memoria
+        self.image_writer.submit(frame, filepath, metadata)
+        self.image_cache.put(filepath, Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+        for row in rows:
+            self.store.append(row)
         self.image_counter += 1
-        self.save_data_to_excel()
 
+        self.explorer_add(filepath)
         self.display_captured_image(filepath)
         self.display_image_metadata(filename)
         self.show_message("Imagen procesada correctamente", 3)
 
+    # Exporta a Excel todo lo registrado en la sesión (bajo demanda o al cerrar la sesión)
     def save_data_to_excel(self):
-        df = pd.DataFrame(self.data, columns=['Filename', 'Reference Area (pixels)', 'Reference Area (cm^2)', 'Leaf Area (pixels)', 'Leaf Area (cm^2)', 'Deficiency', 'Symptoms', 'Treatment', 'Date', 'Time', 'Researcher'])
-        if not os.path.exists(self.excel_filename):
-            df.to_excel(self.excel_filename, index=False)
-        else:
-            existing_df = pd.read_excel(self.excel_filename)
-            if existing_df.empty:
-                df.to_excel(self.excel_filename, index=False)
-            else:
-                combined_df = pd.concat([existing_df, df], ignore_index=True)
-                combined_df.to_excel(self.excel_filename, index=False)
+        if self.store.count == 0:
+            return
+        self.store.export_excel(self.excel_filename)
 
     def run(self):
         self.root.mainloop()
 
+    def close(self):
+        self.pipeline.stop()
+        if self.analysis_pool is not None:
+            self.analysis_pool.close()
+        self.image_writer.close()
+        self.save_data_to_excel()
+        self.cap.release()
+        self.root.destroy()
+
+    # Se ejecuta en el hilo de procesamiento de CapturePipeline: aquí no se toca ningún widget de Tk.
+    # El análisis (analisis.py) trabaja sobre el cuadro limpio; las anotaciones se dibujan después
+    # sobre el mismo cuadro, que es el que se muestra y el que se guarda al capturar.
+    # Con analysis_workers, varios hilos lo llaman a la vez y el análisis se hace en los procesos de procesos.py
+    def analyze_frame(self, frame):
+        with self.capture_lock:
+            capturing, self.capturing = self.capturing, False
+        if self.analysis_pool is None:
+            result = self.analyzer.analyze(frame, capturing)
+        else:
+            result = self.analysis_pool.analyze(frame, capturing)
+        self.reference_area_pixels = result['reference_area_pixels']
+        result['frame'] = annotate(frame, result)
+        if self.analysis_pool is None:
+            result['image'] = Image.fromarray(self.analyzer.processor.rgb(frame))
+        else:
+            # El búfer RGB del analizador es de un solo hilo
+            result['image'] = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        return result
+
+    # Hilo de Tk: sólo dibuja el resultado más reciente del hilo de procesamiento
     def update_frame(self):
-        ret, frame = self.cap.read()
-        if ret:
-            frame, reference_detected = self.process_frame(frame)
-            frame, leaf_contour = self.detect_leaf(frame)
-            self.display_transmission(frame)
-
-            if self.capturing:
-                if leaf_contour is not None and self.reference_area_pixels is not None:
-                    leaf_area_cm2, leaf_area_pixels = self.calculate_leaf_area(leaf_contour)
-                    deficiency, symptoms, treatment = detect_deficiency(frame)
-                    self.save_image_with_metadata(frame, leaf_area_cm2, leaf_area_pixels, deficiency, symptoms, treatment)
-                    if deficiency:
-                        arduino.write(f"Deficiencia:\n{deficiency}".encode())
-                    else:
-                        arduino.write("Hoja sana\n".encode())
-                    self.capturing = False
-                else:
-                    if not reference_detected:
-                        arduino.write("No se detecto el\narea de referenc".encode())
-                    elif leaf_contour is None:
-                        arduino.write("No se detecto la\nhoja".encode())
-                    self.show_message("No se detectó la\nhoja o referenci", 5)
-                    self.capturing = False
+        latest = self.pipeline.latest_result(self.last_sequence)
+        if latest is not None:
+            self.last_sequence, captured_at, result = latest
+            self.display_transmission(result['image'])
+            self.pipeline.mark_displayed(captured_at)
+            # Cada 30 cuadros mostrados (los números de secuencia saltan cuando se descartan cuadros)
+            self.displayed_frames += 1
+            if self.displayed_frames % 30 == 0:
+                self.display_pipeline_stats()
+                # Rangos de color nuevos si cambió la configuración o la calibración
+                settings.maybe_reload()
+        for result in self.pipeline.kept_results():
+            self.handle_capture(result)
 
         self.root.after(10, self.update_frame)
 
+    def handle_capture(self, result):
+        if 'leaves' in result:
+            self.handle_leaves_capture(result)
+            return
+        self.result_sequence += 1
+        if 'leaf_area_cm2' in result:
+            leaf_area_cm2, leaf_area_pixels = result['leaf_area_cm2'], result['leaf_area_pixels']
+            deficiency, symptoms, treatment = deficiency_result(result['deficiency'])
+            send_result(self.result_sequence, settings.deficiency_code[deficiency] if deficiency else CODE_HEALTHY, result['coverage'], leaf_area_cm2)
+            self.save_image_with_metadata(result['frame'], leaf_area_cm2, leaf_area_pixels, deficiency, symptoms, treatment)
+        else:
+            if not result['reference_detected']:
+                send_result(self.result_sequence, CODE_NO_REFERENCE)
+            elif result['leaf_contour'] is None:
+                send_result(self.result_sequence, CODE_NO_LEAF)
+            self.show_message("No se detectó la\nhoja o referenci", 5)
+
+    def handle_leaves_capture(self, result):
+        leaves = result['leaves']
+        if not result['reference_detected'] or self.reference_area_pixels is None or not leaves:
+            self.result_sequence += 1
+            send_result(self.result_sequence, CODE_NO_LEAF if result['reference_detected'] else CODE_NO_REFERENCE)
+            self.show_message("No se detectó la\nhoja o referenci", 5)
+            return
+        # Una trama por hoja, en el mismo orden que las filas
+        for leaf in leaves:
+            self.result_sequence += 1
+            deficiency = leaf['deficiency']
+            coverage = leaf['breakdown'][deficiency]['coverage'] if deficiency else 0.0
+            send_result(self.result_sequence, settings.deficiency_code[deficiency] if deficiency else CODE_HEALTHY, coverage, leaf['area_cm2'])
+        self.save_leaves_with_metadata(result['frame'], leaves)
+
+    def display_pipeline_stats(self):
+        stats = self.pipeline.stats()
+        if stats['latency_ms'] is None:
+            return
+        text = f"{stats['processing_fps']:.0f} fps | latencia {stats['latency_ms']:.0f} ms (p95 {stats['latency_ms_p95']:.0f}) | descartados {stats['dropped']}"
+        if self.analysis_pool is None:
+            text += f" | reservas {self.analyzer.processor.allocations}"
+        else:
+            text += f" | procesos {self.analysis_pool.workers}"
+        self.transmission_canvas.itemconfig(self.stats_text, text=text)
+        self.transmission_canvas.tag_raise(self.stats_text)
+
     def capture_image(self, event=None):
-        self.capturing = True
+        with self.capture_lock:
+            self.capturing = True
 
     def create_gui(self, root):
         self.root = root
         self.root.geometry("1500x750")
-        self.capturing = False
+        with self.capture_lock:
+            self.capturing = False
 
         ## Transmisión
         self.transmission_label = ttk.Label(self.root, text="Live Feed")
         self.transmission_label.place(x=0, y=0, width=750, height=550)
         self.transmission_canvas = tk.Canvas(self.root, bg="black")
         self.transmission_canvas.place(x=0, y=0, width=750, height=550)
+        self.transmission_item = None
+        self.stats_text = self.transmission_canvas.create_text(740, 540, anchor=tk.SE, fill="yellow", text="")
         ## Imagen
         self.captured_label = ttk.Label(self.root, text="Captured Image")
         self.captured_label.place(x=750, y=0, width=750, height=550)
@@ -204,6 +265,9 @@ class LiveFeed:
         self.zoom_level = 1.0
         self.pan_x = 0
         self.pan_y = 0
+        self.current_image_path = None
+        self.captured_item = None
+        self.image_cache = ImageCache()
         self.captured_canvas.bind("<ButtonPress-1>", self.start_pan)
         self.captured_canvas.bind("<B1-Motion>", self.do_pan)
         self.captured_canvas.bind("<MouseWheel>", self.do_zoom)
@@ -215,6 +279,8 @@ class LiveFeed:
         self.file_explorer_tree.place(x=0, y=550, width=350, height=200)
         self.file_explorer_tree.bind('<Button-3>', self.show_file_options)
         self.file_explorer_tree.bind('<Double-1>', self.open_file)
+        self.file_explorer_tree.bind('<<TreeviewOpen>>', self.expand_explorer_node)
+        self.folder_cache = {}
         
         ## Datos
         self.data_label = ttk.Label(self.root, text="Data")
@@ -231,18 +297,26 @@ class LiveFeed:
         self.center_image_button = ttk.Button(self.root, text="Center Image", command=self.center_image)
         self.center_image_button.place(x=1350, y=500, width=100, height=35)
 
+        self.export_button = ttk.Button(self.root, text="Export Excel", command=self.export_excel)
+        self.export_button.place(x=1050, y=500, width=100, height=35)
+
         self.load_file_explorer()
 
         self.root.bind('<s>', self.capture_image)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
     def start_pan(self, event):
         self.pan_start_x = event.x
         self.pan_start_y = event.y
 
+    # Desplazar sólo mueve el elemento del canvas; la imagen no se vuelve a generar
     def do_pan(self, event):
-        self.pan_x += event.x - self.pan_start_x
-        self.pan_y += event.y - self.pan_start_y
-        self.display_captured_image(self.current_image_path)
+        dx = event.x - self.pan_start_x
+        dy = event.y - self.pan_start_y
+        self.pan_x += dx
+        self.pan_y += dy
+        if self.captured_item is not None:
+            self.captured_canvas.move(self.captured_item, dx, dy)
         self.pan_start_x = event.x
         self.pan_start_y = event.y
 
@@ -252,29 +326,41 @@ class LiveFeed:
         elif event.delta < 0:
             self.zoom_level /= 1.1
         self.zoom_level = min(max(self.zoom_level, 0.1), 3.0)
-        self.display_captured_image(self.current_image_path)
+        if self.current_image_path:
+            self.display_captured_image(self.current_image_path)
         self.show_message(f"Zoom: {self.zoom_level:.1f}x", 2)
 
     def center_image(self):
         self.zoom_level = 1.0
         self.pan_x = 0
         self.pan_y = 0
-        self.display_captured_image(self.current_image_path)
-
-    def display_transmission(self, frame):
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame_pil = Image.fromarray(frame_rgb)
-        frame_tk = ImageTk.PhotoImage(frame_pil)
-        self.transmission_canvas.create_image(0, 0, anchor=tk.NW, image=frame_tk)
-        self.transmission_canvas.image = frame_tk
+        if self.current_image_path:
+            self.display_captured_image(self.current_image_path)
+
+    # frame_pil ya viene convertido a RGB desde el hilo de procesamiento; se reutiliza la misma
+    # PhotoImage y el mismo elemento del canvas en lugar de crear uno nuevo por cuadro
+    def display_transmission(self, frame_pil):
+        frame_tk = getattr(self.transmission_canvas, 'image', None)
+        if frame_tk is None or (frame_tk.width(), frame_tk.height()) != frame_pil.size:
+            frame_tk = ImageTk.PhotoImage(frame_pil)
+            self.transmission_canvas.image = frame_tk
+        else:
+            frame_tk.paste(frame_pil)
+        if self.transmission_item is None:
+            self.transmission_item = self.transmission_canvas.create_image(0, 0, anchor=tk.NW, image=frame_tk)
+        else:
+            self.transmission_canvas.itemconfig(self.transmission_item, image=frame_tk)
 
+    # La imagen decodificada y cada nivel de zoom salen de la caché; sólo se lee el disco la primera vez
     def display_captured_image(self, filepath):
         self.current_image_path = filepath
-        frame_pil = Image.open(filepath)
-        width, height = frame_pil.size
-        frame_pil = frame_pil.resize((int(width * self.zoom_level), int(height * self.zoom_level)), Image.LANCZOS)
+        frame_pil = self.image_cache.scaled(filepath, self.zoom_level)
         frame_tk = ImageTk.PhotoImage(frame_pil)
-        self.captured_canvas.create_image(self.pan_x, self.pan_y, anchor=tk.NW, image=frame_tk)
+        if self.captured_item is None:
+            self.captured_item = self.captured_canvas.create_image(self.pan_x, self.pan_y, anchor=tk.NW, image=frame_tk)
+        else:
+            self.captured_canvas.itemconfig(self.captured_item, image=frame_tk)
+            self.captured_canvas.coords(self.captured_item, self.pan_x, self.pan_y)
         self.captured_canvas.image = frame_tk
 
     def show_message(self, message, duration):
@@ -282,25 +368,71 @@ class LiveFeed:
         self.message_label.place(x=1160, y=450, width=200, height=20)
         self.root.after(duration * 1000, self.message_label.destroy)
 
+    # El explorador es perezoso: sólo se listan las carpetas de primer nivel y el contenido de cada
+    # carpeta se lee al expandirla. El iid de cada elemento es su ruta relativa.
     def load_file_explorer(self):
         self.file_explorer_tree.delete(*self.file_explorer_tree.get_children())
-        for folder in sorted(os.listdir(".")):
-            if os.path.isdir(folder) and folder.startswith("session_"):
-                session_node = self.file_explorer_tree.insert("", "end", text=folder, open=False)
-                for file in sorted(os.listdir(folder)):
-                    self.file_explorer_tree.insert(session_node, "end", text=file)
-            if folder == "trash":
-                trash_node = self.file_explorer_tree.insert("", "end", text="trash", open=False)
-                for file in sorted(os.listdir(os.path.join(folder))):
-                    self.file_explorer_tree.insert(trash_node, "end", text=file)
+        for name, is_dir in self.list_folder("."):
+            if is_dir and self.is_explorer_root(name):
+                self.insert_explorer_node("", name, is_dir)
+
+    def is_explorer_root(self, name):
+        return name.startswith("session_") or name == "trash"
+
+    # Lista una carpeta con os.scandir (sin un stat por archivo); el resultado se reutiliza mientras
+    # no cambie la fecha de modificación de la carpeta
+    def list_folder(self, folder):
+        mtime = os.stat(folder).st_mtime_ns
+        cached = self.folder_cache.get(folder)
+        if cached is None or cached[0] != mtime:
+            with os.scandir(folder) as entries:
+                listing = sorted((entry.name, entry.is_dir()) for entry in entries)
+            cached = self.folder_cache[folder] = (mtime, listing)
+        return cached[1]
+
+    def insert_explorer_node(self, parent, path, is_dir, index="end"):
+        node = self.file_explorer_tree.insert(parent, index, iid=path, text=os.path.basename(path), open=False)
+        if is_dir:
+            # Hijo vacío para que aparezca la flecha de expandir
+            self.file_explorer_tree.insert(node, "end", iid=path + "::pendiente", text="")
+        return node
+
+    def expand_explorer_node(self, event=None):
+        node = self.file_explorer_tree.focus()
+        placeholder = node + "::pendiente"
+        if not self.file_explorer_tree.exists(placeholder):
+            return
+        self.file_explorer_tree.delete(placeholder)
+        for name, is_dir in self.list_folder(node):
+            self.insert_explorer_node(node, os.path.join(node, name), is_dir)
+
+    # Actualizaciones incrementales: sólo se toca el elemento que cambió, sin reconstruir el árbol
+    def explorer_add(self, path):
+        path = os.path.normpath(path)
+        parent = os.path.dirname(path)
+        self.folder_cache.pop(parent or ".", None)
+        if self.file_explorer_tree.exists(path):
+            return
+        if parent:
+            # Si la carpeta no se ha expandido, el archivo aparecerá cuando se abra
+            if not self.file_explorer_tree.exists(parent) or self.file_explorer_tree.exists(parent + "::pendiente"):
+                return
+        elif not self.is_explorer_root(os.path.basename(path)):
+            return
+        siblings = [self.file_explorer_tree.item(child, "text") for child in self.file_explorer_tree.get_children(parent)]
+        self.insert_explorer_node(parent, path, os.path.isdir(path), bisect.bisect(siblings, os.path.basename(path)))
+
+    def explorer_remove(self, path):
+        path = os.path.normpath(path)
+        self.folder_cache.pop(os.path.dirname(path) or ".", None)
+        if self.file_explorer_tree.exists(path):
+            self.file_explorer_tree.delete(path)
 
     def show_file_options(self, event):
         item_id = self.file_explorer_tree.identify_row(event.y)
-        if not item_id:
+        if not item_id or item_id.endswith("::pendiente"):
             return
-        item_text = self.file_explorer_tree.item(item_id, "text")
-        parent_text = self.file_explorer_tree.item(self.file_explorer_tree.parent(item_id), "text")
-        item_path = os.path.join(parent_text, item_text)
+        item_path = item_id
 
         menu = tk.Menu(self.root, tearoff=0)
         menu.add_command(label="Open", command=lambda: self.open_file(None, item_path))
@@ -316,61 +448,100 @@ class LiveFeed:
             item_id = self.file_explorer_tree.selection()
             if not item_id:
                 return
-            item_id = item_id[0]
-            item_text = self.file_explorer_tree.item(item_id, "text")
-            parent_text = self.file_explorer_tree.item(self.file_explorer_tree.parent(item_id), "text")
-            item_path = os.path.join(parent_text, item_text)
+            item_path = item_id[0]
 
+        self.image_writer.wait(item_path)
         if not os.path.isfile(item_path):
             messagebox.showwarning("Open File", "Cannot open directory.")
             return
 
-        if item_path.endswith(".xlsx"):
+        if item_path.endswith((".xlsx", ".csv")):
             self.display_data(item_path)
         else:
             self.display_captured_image(item_path)
-            self.display_image_metadata(os.path.basename(item_path))
-
-    def display_image_metadata(self, image_name):
-        if not os.path.exists(self.excel_filename):
-            return
-        
-        df = pd.read_excel(self.excel_filename)
-        metadata = df[df['Filename'] == image_name]
-        if not metadata.empty:
+            self.display_image_metadata(os.path.basename(item_path), self.store_for(item_path))
+
+    # Registro de la sesión a la que pertenece un archivo; el CSV de cada sesión se lee una sola vez
+    # y queda en caché por carpeta. Mover a la papelera o restaurar no cambia el nombre del archivo,
+    # así que el índice sigue siendo válido. Una carpeta sin CSV no se guarda en caché: se vuelve a
+    # buscar la próxima vez, por si ya se guardó el primer resultado.
+    def store_for(self, item_path):
+        folder = os.path.dirname(item_path)
+        if os.path.basename(folder) == "trash":
+            folder = os.path.dirname(folder)
+        folder = os.path.abspath(folder)
+        if folder not in self.stores:
+            names = sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+            csv_names = [name for name in names if name.startswith("leaf_data_") and name.endswith(".csv")]
+            if not csv_names:
+                return None
+            self.stores[folder] = ResultsStore(os.path.join(folder, csv_names[0]), DATA_COLUMNS)
+        return self.stores[folder]
+
+    def display_image_metadata(self, image_name, store=None):
+        store = store or self.store
+        rows = store.lookup_all(image_name) if store else []
+        if rows:
+            metadata = pd.DataFrame(rows, columns=store.columns)
             self.data_text.insert(tk.END, metadata.to_string(index=False))
             self.data_text.insert(tk.END, '\n\n')
             self.data_text.see(tk.END)  # Scroll to the end
 
     def move_to_trash(self, item_path):
         if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this file?"):
+            self.image_writer.wait(item_path)
             shutil.move(item_path, self.trash_folder)
-            self.load_file_explorer()
+            self.image_cache.discard(item_path)
+            self.explorer_remove(item_path)
+            self.explorer_add(os.path.join(self.trash_folder, os.path.basename(item_path)))
             self.show_message("Archivo movido a la papelera", 3)
 
     def restore_from_trash(self, item_path):
         original_path = os.path.join(self.session_folder, os.path.basename(item_path))
         shutil.move(item_path, original_path)
-        self.load_file_explorer()
+        self.image_cache.discard(item_path)
+        self.explorer_remove(item_path)
+        self.explorer_add(original_path)
         self.show_message("Archivo restaurado", 3)
 
     def delete_permanently(self, item_path):
         if messagebox.askyesno("Confirm Permanent Delete", "Are you sure you want to permanently delete this file?"):
+            self.image_writer.wait(item_path)
             os.remove(item_path)
-            self.load_file_explorer()
+            self.image_cache.discard(item_path)
+            self.explorer_remove(item_path)
             self.show_message("Archivo eliminado permanentemente", 3)
 
     def display_data(self, filepath):
         self.data_text.delete(1.0, tk.END)
-        df = pd.read_excel(filepath)
+        if filepath.endswith(".csv"):
+            store = self.store_for(filepath)
+            df = store.dataframe() if store else pd.read_csv(filepath, encoding='utf-8-sig')
+        else:
+            df = pd.read_excel(filepath)
         self.data_text.insert(tk.END, df.to_string(index=False))
         self.data_text.see(tk.END)  # Scroll to the end
 
+    def export_excel(self):
+        if self.store.count == 0:
+            self.show_message("No hay datos para exportar", 3)
+            return
+        self.save_data_to_excel()
+        self.explorer_add(self.excel_filename)
+        self.show_message("Excel exportado", 3)
+
     def create_new_session_gui(self):
+        self.image_writer.wait_folder(self.session_folder)
         if self.image_counter == 1:
             shutil.rmtree(self.session_folder)
+            self.image_cache.discard_folder(self.session_folder)
+            self.stores.pop(os.path.abspath(self.session_folder), None)
+            self.explorer_remove(self.session_folder)
+        else:
+            self.save_data_to_excel()
+            self.explorer_add(self.excel_filename)
         self.create_new_session()
-        self.load_file_explorer()
+        self.explorer_add(self.session_folder)
         self.show_message("New session created", 3)
 
     def rename_session(self):
@@ -378,42 +549,53 @@ class LiveFeed:
         if new_name:
             new_name = new_name.split("/")[-1]
             new_path = os.path.join(".", new_name)
+            old_folder = self.session_folder
+            self.image_writer.wait_folder(self.session_folder)
             os.rename(self.session_folder, new_path)
+            self.image_cache.discard_folder(self.session_folder)
             self.session_folder = new_path
             self.trash_folder = os.path.join(self.session_folder, "trash")
             self.excel_filename = os.path.join(self.session_folder, os.path.basename(self.excel_filename))
-            self.load_file_explorer()
+            self.stores.pop(os.path.abspath(old_folder), None)
+            self.store.move(os.path.join(self.session_folder, os.path.basename(self.store.path)))
+            self.stores[os.path.abspath(self.session_folder)] = self.store
+            self.explorer_remove(old_folder)
+            self.explorer_add(self.session_folder)
             self.show_message("Session renamed", 3)
 
-def detect_deficiency(image):
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    
-    for deficiency, info in deficiency_info.items():
-        lower, upper = info['color_range']
-        lower = np.array(lower, dtype=np.uint8)
-        upper = np.array(upper, dtype=np.uint8)
-        
-        mask = cv2.inRange(hsv, lower, upper)
-        if cv2.countNonZero(mask) > 0:
-            return deficiency, info['symptoms'], info['treatment']
-    
-    return None, None, None
 
+# Los trabajadores de análisis (procesos.py, spawn) vuelven a importar este script como __mp_main__:
+# fuera de este bloque sólo hay definiciones; la cámara, la ventana y el puerto serie se abren aquí.
 if __name__ == "__main__":
+    serial_options = settings.serial('Sistema')
+    parser = argparse.ArgumentParser(description="Medición de área y deficiencias de hojas")
+    parser.add_argument('port', nargs='?', default=serial_options.get('port'), help="Puerto del Arduino (p. ej. COM3), o 'sim://?trigger=P&interval=5' para un Arduino simulado")
+    parser.add_argument('--texto', action='store_true', help="Enviar los mensajes de texto del LCD en lugar de tramas binarias")
+    args = parser.parse_args()
+    text_mode = args.texto
+    port = args.port
+    if port:
+        # El reinicio del Arduino al conectarse se espera en la primera escritura, no aquí
+        arduino = open_transport(port, serial_options.get('baudrate', 9600), reset_delay=serial_options.get('reset_delay', 13))
     root = tk.Tk()
     live_feed = LiveFeed(root)
     
+    # readline espera bloqueado (con tiempo límite) en lugar de consultar in_waiting sin pausa;
+    # con el puerto cerrado lanza un OSError y el hilo termina
     def arduino_listener():
         while True:
-            if arduino.in_waiting > 0:
-                incoming_data = arduino.readline().decode().strip()
-                if incoming_data == 'P':
-                    time.sleep(2)
-                    live_feed.capture_image()
+            try:
+                incoming_data = arduino.readline().decode(errors='ignore').strip()
+            except OSError as e:
+                print("Se cerró la comunicación con el Arduino:", e)
+                break
+            if incoming_data == serial_options.get('trigger', 'P'):
+                time.sleep(serial_options.get('capture_delay', 2.0))
+                live_feed.capture_image()
     
-    import threading
-    arduino_thread = threading.Thread(target=arduino_listener)
-    arduino_thread.daemon = True
-    arduino_thread.start()
+    if arduino is not None:
+        arduino_thread = threading.Thread(target=arduino_listener)
+        arduino_thread.daemon = True
+        arduino_thread.start()
     
     live_feed.run()
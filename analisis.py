@@ -0,0 +1,227 @@
+##Núcleo del análisis de hojas, sin interfaz: cuadro -> resultado (contornos, áreas, desglose de
+##deficiencias y tiempos de cada etapa). Lo usan Sistema.py y Sis.py (vista en vivo), lote.py (carpetas de
+##imágenes, en procesos sin tkinter), benchmark.py y el cálculo de área de SisEmbebido.py, así que la parte
+##pesada se mide, se optimiza y se paraleliza en un solo lugar. Nada de aquí importa tkinter ni dibuja,
+##salvo annotate(), que sólo usa OpenCV.
+
+import time
+
+import cv2
+import numpy as np
+
+from configuracion import load_settings
+from procesamiento import FrameProcessor
+from referencia import ReferenceTracker, find_reference_contour, reference_bounds, reference_roi
+from segmentacion import measure_leaves, set_reference, draw_leaves
+
+# La tabla de deficiencias y el clasificador se leen de settings en cada llamada: una recarga los reemplaza
+settings = load_settings()
+
+# Columnas de la tabla de resultados (sesiones y análisis por lotes)
+DATA_COLUMNS = ['Filename', 'Reference Area (pixels)', 'Reference Area (cm^2)', 'Leaf Area (pixels)', 'Leaf Area (cm^2)', 'Deficiency', 'Symptoms', 'Treatment', 'Date', 'Time', 'Researcher']
+
+# Contorno más grande de una imagen binaria (si supera min_area) o None
+def largest_contour(binary, min_area=0):
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if contours:
+        max_contour = max(contours, key=cv2.contourArea)
+        if cv2.contourArea(max_contour) > min_area:
+            return max_contour
+    return None
+
+# Busca la hoja; devuelve el contorno más grande del cuadro o None.
+# Para llamadas sueltas (lotes, recortes al capturar); la vista previa usa el FrameProcessor de LeafAnalyzer
+def find_leaf_contour(frame):
+    return FrameProcessor().find_leaf_contour(frame)
+
+# Hoja (o referencia) oscura con un umbral fijo, sin Otsu ni bordes: la detección de Sis.py y SisEmbebido.py
+def find_dark_contour(frame, threshold=127):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY_INV)
+    return largest_contour(binary)
+
+# Escala de detección automática: la mayor potencia de 1/2 que deja el cuadro con al menos min_width
+# de ancho (las potencias de 2 con INTER_AREA son más rápidas que un factor arbitrario)
+def auto_detection_scale(frame_width, min_width=640):
+    scale = 1.0
+    while frame_width * scale / 2 >= min_width:
+        scale /= 2
+    return scale
+
+# Busca la hoja en el cuadro reducido a `scale`; el contorno se devuelve en coordenadas del cuadro original.
+# Sirve para la vista previa: el área tiene un error del orden de 0.1 % (ver benchmark.py); para medir se usa refine_leaf_contour.
+def find_leaf_contour_scaled(frame, scale=1.0):
+    return FrameProcessor().find_leaf_contour_scaled(frame, scale)
+
+# Vuelve a buscar la hoja a resolución completa sólo dentro del recuadro del contorno aproximado (más un margen)
+def refine_leaf_contour(frame, contour, margin=0.1):
+    frame_height, frame_width = frame.shape[:2]
+    x, y, w, h = cv2.boundingRect(contour)
+    pad = int(max(w, h) * margin) + 8
+    x0, y0 = max(0, x - pad), max(0, y - pad)
+    x1, y1 = min(frame_width, x + w + pad), min(frame_height, y + h + pad)
+    refined = find_leaf_contour(frame[y0:y1, x0:x1])
+    if refined is None:
+        return contour
+    return refined + np.array([x0, y0], dtype=refined.dtype)
+
+# Convierte el área de la hoja a cm^2 usando el área de referencia
+def leaf_area_from_reference(leaf_contour, reference_area_pixels, reference_area_cm2=1):
+    leaf_area_pixels = cv2.contourArea(leaf_contour)
+    leaf_area_cm2 = (leaf_area_pixels / reference_area_pixels) * reference_area_cm2
+    return leaf_area_cm2, leaf_area_pixels
+
+# Área de la hoja en cm^2 a partir de los dos contornos (la de SisEmbebido.py)
+def calculate_area(leaf_contour, reference_contour, reference_cm2):
+    return leaf_area_from_reference(leaf_contour, cv2.contourArea(reference_contour), reference_cm2)[0]
+
+# Cuadro de SisEmbebido.py: la referencia ocupa el primer cuarto a la izquierda y la hoja el resto.
+# Devuelve el área de la hoja en cm^2, o None si falta alguno de los dos contornos.
+def split_frame_leaf_area(frame, threshold=128, reference_cm2=1.0):
+    width = frame.shape[1]
+    reference_contour = find_dark_contour(frame[:, :width // 4], threshold)
+    leaf_contour = find_dark_contour(frame[:, width // 4:], threshold)
+    if reference_contour is None or leaf_contour is None:
+        return None
+    return calculate_area(leaf_contour, reference_contour, reference_cm2)
+
+# Conteo de píxeles y cobertura de cada deficiencia; con leaf_contour sólo se analiza la hoja
+def deficiency_breakdown(image, leaf_contour=None, classifier=None):
+    classifier = classifier or settings.classifier
+    if leaf_contour is not None:
+        return classifier.breakdown_leaf(image, leaf_contour)
+    return classifier.breakdown(image)
+
+# Devuelve la deficiencia dominante (la de mayor cobertura), no la primera que aparezca en el diccionario
+def detect_deficiency(image, leaf_contour=None):
+    return deficiency_result(settings.classifier.dominant(deficiency_breakdown(image, leaf_contour)))
+
+def deficiency_result(deficiency):
+    if deficiency:
+        info = settings.deficiency_info[deficiency]
+        return deficiency, info['symptoms'], info['treatment']
+
+    return None, None, None
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+class LeafAnalyzer:
+    # reference_area_cm2: área real del cuadro de referencia
+    # reference_interval: cada cuántos cuadros se vuelve a medir el cuadro de referencia
+    # multi_leaf: medir todas las hojas del cuadro (una fila por hoja) en lugar de sólo la más grande
+    # detection_scale: escala a la que se busca la hoja en la vista previa (None: automática, 1.0: resolución completa);
+    #                  al capturar, el contorno se refina a resolución completa
+    # Guarda estado entre cuadros (referencia, búferes): se usa desde un solo hilo.
+    def __init__(self, reference_area_cm2=1, reference_interval=15, multi_leaf=False, detection_scale=None):
+        self.reference_area_cm2 = reference_area_cm2
+        self.multi_leaf = multi_leaf
+        self.detection_scale = detection_scale
+        self.processor = FrameProcessor()
+        self.reference_options = {'threshold': settings.threshold('reference_gray', 50), 'min_area': settings.threshold('reference_min_area', 100)}
+        self.reference_tracker = ReferenceTracker(interval=reference_interval, **self.reference_options)
+
+    @property
+    def reference_area_pixels(self):
+        return self.reference_tracker.area
+
+    def leaf_detection_scale(self, frame):
+        return self.detection_scale or auto_detection_scale(frame.shape[1])
+
+    # Cuadro de la cámara: la referencia se sigue con ReferenceTracker y la hoja se busca a escala reducida.
+    # capturing: medir el área y las deficiencias (si no, sólo lo necesario para la vista previa).
+    # Devuelve un diccionario con capturing, reference_contour (en coordenadas de la ROI), reference_detected,
+    # reference_confidence, reference_area_pixels, leaf_contour, timings (ms) y, según el caso:
+    #   una hoja al capturar: leaf_area_cm2, leaf_area_pixels, breakdown, deficiency, coverage
+    #   varias hojas: leaves (ver segmentacion.measure_leaves)
+    # reference: el de track_reference() si la referencia ya se siguió en otro lado (procesos.py); si no, se sigue aquí
+    def analyze(self, frame, capturing=False, reference=None):
+        start = time.perf_counter()
+        if reference is None:
+            reference = self.track_reference(frame)
+        result = self.new_result(capturing, *reference, {'reference_ms': elapsed_ms(start)})
+        self.analyze_leaves(frame, result, self.leaf_detection_scale(frame))
+        result['timings']['total_ms'] = elapsed_ms(start)
+        return result
+
+    # (reference_contour, reference_detected, reference_area_pixels, reference_confidence) después de ver el cuadro
+    def track_reference(self, frame):
+        reference_contour, reference_detected = self.reference_tracker.update(frame)
+        return reference_contour, reference_detected, self.reference_tracker.area, self.reference_tracker.confidence
+
+    # Imagen suelta (lotes): la referencia se mide en la imagen misma y la hoja se busca a resolución completa
+    def analyze_image(self, frame):
+        start = time.perf_counter()
+        reference_contour = find_reference_contour(frame, **self.reference_options)
+        reference_area_pixels = cv2.contourArea(reference_contour) if reference_contour is not None else None
+        result = self.new_result(True, reference_contour, reference_contour is not None, reference_area_pixels,
+                                 1.0 if reference_contour is not None else 0.0, {'reference_ms': elapsed_ms(start)})
+        self.analyze_leaves(frame, result, 1.0)
+        result['timings']['total_ms'] = elapsed_ms(start)
+        return result
+
+    def new_result(self, capturing, reference_contour, reference_detected, reference_area_pixels, reference_confidence, timings):
+        return {
+            'capturing': capturing,
+            'reference_contour': reference_contour,
+            'reference_detected': reference_detected,
+            'reference_confidence': reference_confidence,
+            'reference_area_pixels': reference_area_pixels,
+            'reference_area_cm2': self.reference_area_cm2,
+            'leaf_contour': None,
+            'timings': timings,
+        }
+
+    def analyze_leaves(self, frame, result, scale):
+        # El clasificador se toma una vez por cuadro: una recarga de colores a la mitad no mezcla rangos
+        classifier = settings.classifier
+        timings = result['timings']
+        if self.multi_leaf:
+            # El desglose de deficiencias (en una sola pasada para todas las hojas) se calcula sólo al capturar
+            start = time.perf_counter()
+            leaves = measure_leaves(frame, classifier if result['capturing'] else None, min_area=settings.threshold('leaf_min_area', 1000))
+            result['leaves'] = set_reference(leaves, result['reference_area_pixels'], self.reference_area_cm2)
+            timings['leaves_ms'] = elapsed_ms(start)
+            return
+
+        start = time.perf_counter()
+        leaf_contour = self.processor.find_leaf_contour_scaled(frame, scale)
+        timings['leaf_ms'] = elapsed_ms(start)
+        result['leaf_contour'] = leaf_contour
+        if not result['capturing'] or leaf_contour is None or result['reference_area_pixels'] is None:
+            return
+
+        # La medición usa el contorno a resolución completa, buscado sólo dentro del recuadro de la vista previa
+        if scale < 1.0:
+            start = time.perf_counter()
+            leaf_contour = refine_leaf_contour(frame, leaf_contour)
+            result['leaf_contour'] = leaf_contour
+            timings['refine_ms'] = elapsed_ms(start)
+        result['leaf_area_cm2'], result['leaf_area_pixels'] = leaf_area_from_reference(leaf_contour, result['reference_area_pixels'], self.reference_area_cm2)
+        start = time.perf_counter()
+        breakdown = deficiency_breakdown(frame, leaf_contour, classifier)
+        deficiency = classifier.dominant(breakdown)
+        result['breakdown'] = breakdown
+        result['deficiency'] = deficiency
+        result['coverage'] = breakdown[deficiency]['coverage'] if deficiency else 0.0
+        timings['breakdown_ms'] = elapsed_ms(start)
+
+# Dibuja el resultado de LeafAnalyzer sobre el cuadro (después de analizarlo, para no detectar las anotaciones)
+def annotate(frame, result):
+    top, bottom, left, right = reference_bounds(frame)
+    if result['reference_contour'] is not None:
+        cv2.drawContours(reference_roi(frame), [result['reference_contour']], -1, (0, 255, 255), 2)
+    cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
+    if result['reference_detected']:
+        reference_text = f"Referencia detectada ({result['reference_confidence']:.0%})"
+    else:
+        reference_text = "Referencia NO detectada"
+    cv2.putText(frame, reference_text, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+
+    if 'leaves' in result:
+        draw_leaves(frame, result['leaves'])
+        cv2.putText(frame, f"Hojas detectadas: {len(result['leaves'])}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    elif result['leaf_contour'] is not None:
+        cv2.drawContours(frame, [result['leaf_contour']], -1, (0, 255, 0), 2)
+        cv2.putText(frame, "Hoja detectada", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    return frame
@@ -0,0 +1,228 @@
+##Banco de pruebas de rendimiento del proceso de Sistema.py (el núcleo de analisis.py), sin cámara, Arduino ni pantalla.
+##Genera cuadros sintéticos (resolución, número de hojas y manchas con los colores de deficiency_info)
+##y reporta por etapa la latencia (p50/p95/p99), el rendimiento (operaciones/s) y la memoria pico.
+##
+##Uso: python benchmark.py [--resolutions 640x480,1920x1080] [--leaves 1,4] [--repeat 50] [--json salida.json]
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from PIL import Image
+
+from analisis import (DATA_COLUMNS, LeafAnalyzer, annotate, detect_deficiency, find_leaf_contour, leaf_area_from_reference,
+                      refine_leaf_contour, settings)
+from deficiencias import HUE_RANGE
+from escritura import ImageWriter
+from registro import ResultsStore
+from segmentacion import measure_leaves
+from visor import ImageCache
+
+BACKGROUND_BGR = (225, 225, 225)
+LEAF_HSV = (55, 170, 110)
+
+def hsv_to_bgr(hsv):
+    pixel = np.array([[hsv]], dtype=np.uint8)
+    return tuple(int(c) for c in cv2.cvtColor(pixel, cv2.COLOR_HSV2BGR)[0, 0])
+
+# Color en el centro del rango HSV de cada deficiencia
+def lesion_colors(info=None):
+    colors = {}
+    for name, data in (info or settings.deficiency_info).items():
+        lower, upper = data['color_range']
+        center = [(lo + hi) // 2 for lo, hi in zip(lower, upper)]
+        if lower[0] > upper[0]:
+            # Rango de tono que da la vuelta por el rojo
+            center[0] = (lower[0] + upper[0] + HUE_RANGE) // 2 % HUE_RANGE
+        colors[name] = hsv_to_bgr(center)
+    return colors
+
+# Cuadro sintético: fondo claro, cuadro de referencia negro en la región de referencia de Sistema.py
+# y `leaves` hojas elípticas en cuadrícula, cada una con `lesions` manchas de colores de deficiencias.
+# Devuelve el cuadro y una lista con la máscara real de cada hoja (para medir exactitud).
+def synthetic_frame(width=1280, height=720, leaves=1, lesions=3, reference_side=50, seed=0, info=None):
+    rng = np.random.default_rng(seed)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = BACKGROUND_BGR
+
+    center = (100, height - 100)
+    half = reference_side // 2
+    cv2.rectangle(frame, (center[0] - half, center[1] - half), (center[0] + half - 1, center[1] + half - 1), (0, 0, 0), -1)
+
+    colors = list(lesion_colors(info).values())
+    leaf_color = hsv_to_bgr(LEAF_HSV)
+    # La zona útil excluye la franja izquierda donde está la referencia
+    left = 180
+    cols = int(np.ceil(np.sqrt(leaves)))
+    rows = int(np.ceil(leaves / cols))
+    cell_w = (width - left) // cols
+    cell_h = height // rows
+    masks = []
+    for i in range(leaves):
+        cx = left + (i % cols) * cell_w + cell_w // 2
+        cy = (i // cols) * cell_h + cell_h // 2
+        axes = (int(cell_w * rng.uniform(0.28, 0.4)), int(cell_h * rng.uniform(0.22, 0.35)))
+        angle = float(rng.uniform(0, 180))
+        mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.ellipse(mask, (cx, cy), axes, angle, 0, 360, 255, -1)
+        frame[mask > 0] = leaf_color
+        for _ in range(lesions if colors else 0):
+            radius = max(2, int(min(axes) * rng.uniform(0.08, 0.2)))
+            offset = rng.uniform(-0.5, 0.5, 2) * np.array(axes)
+            spot = np.zeros_like(mask)
+            cv2.circle(spot, (int(cx + offset[0]), int(cy + offset[1])), radius, 255, -1)
+            frame[(spot > 0) & (mask > 0)] = colors[int(rng.integers(len(colors)))]
+        masks.append(mask)
+    return frame, masks
+
+def summarize(durations):
+    ms = np.array(durations) * 1000
+    return {
+        'n': len(ms),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'ops_per_s': float(1000 / ms.mean()) if ms.mean() > 0 else float('inf'),
+    }
+
+# Mide una etapa: `prepare` genera los argumentos fuera del tiempo medido (p. ej. copiar el cuadro)
+def measure(stage, prepare, repeat, warmup, memory_runs=3):
+    for _ in range(warmup):
+        stage(*prepare())
+    durations = []
+    for _ in range(repeat):
+        args = prepare()
+        start = time.perf_counter()
+        stage(*args)
+        durations.append(time.perf_counter() - start)
+    result = summarize(durations)
+
+    # La memoria se mide aparte porque tracemalloc altera los tiempos
+    # (registra las asignaciones de Python y NumPy, no las internas de OpenCV)
+    tracemalloc.start()
+    peak = 0
+    for _ in range(memory_runs):
+        args = prepare()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        stage(*args)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+    result['peak_kib'] = peak / 1024
+    return result
+
+def run_benchmarks(resolutions, leaf_counts, repeat=50, warmup=5, lesions=3):
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for width, height in resolutions:
+            for leaves in leaf_counts:
+                frame, _ = synthetic_frame(width, height, leaves, lesions)
+                analyzer = LeafAnalyzer()
+                for _ in range(20):
+                    analyzer.analyze(frame)
+                preview_contour = analyzer.analyze(frame)['leaf_contour']
+                leaf_contour = refine_leaf_contour(frame, preview_contour)
+                leaf_area_cm2, leaf_area_pixels = leaf_area_from_reference(leaf_contour, analyzer.reference_area_pixels)
+                preview = analyzer.analyze(frame)
+                # Error relativo del área con respecto a buscar la hoja en todo el cuadro a resolución completa
+                full_area = cv2.contourArea(find_leaf_contour(frame))
+                area_error = {'preview': cv2.contourArea(preview_contour) / full_area - 1, 'refined': leaf_area_pixels / full_area - 1}
+                deficiency, symptoms, treatment = detect_deficiency(frame, leaf_contour)
+                store = ResultsStore(os.path.join(folder, f"leaf_data_{width}x{height}_{leaves}.csv"), DATA_COLUMNS)
+                timestamp = datetime.datetime.now()
+                counter = itertools.count(1)
+                writer = ImageWriter(workers=1)
+                cache = ImageCache()
+
+                def next_row():
+                    return [f"hoja_{next(counter)}.png", analyzer.reference_area_pixels, 1, leaf_area_pixels, leaf_area_cm2, deficiency or '-', symptoms or '-', treatment or '-',
+                            timestamp.strftime('%Y-%m-%d'), timestamp.strftime('%H:%M:%S'), 'Diego Ramos']
+
+                # Lo que queda en el hilo de Tk al capturar: encolar la escritura y entregar la imagen al visor
+                def save_image_submit(image):
+                    path = os.path.join(folder, 'hoja.png')
+                    writer.submit(image, path, dict(zip(DATA_COLUMNS, next_row())))
+                    cache.put(path, Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))
+
+                # La escritura anterior termina fuera del tiempo medido
+                def after_write():
+                    writer.wait()
+                    return (frame,)
+
+                # Codificación y escritura completas (PNG nivel 1 con los datos en un fragmento iTXt), esperando al hilo
+                def write_image(image):
+                    writer.submit(image, os.path.join(folder, 'hoja.png'), dict(zip(DATA_COLUMNS, next_row()))).result()
+
+                stages = {
+                    'reference_tracker': (analyzer.reference_tracker.update, lambda: (frame,)),
+                    'detect_leaf': (analyzer.processor.find_leaf_contour_scaled, lambda: (frame, analyzer.leaf_detection_scale(frame))),
+                    'detect_leaf (resolución completa)': (find_leaf_contour, lambda: (frame,)),
+                    'refine_leaf_contour (al capturar)': (refine_leaf_contour, lambda: (frame, preview_contour)),
+                    'calculate_leaf_area': (leaf_area_from_reference, lambda: (leaf_contour, analyzer.reference_area_pixels)),
+                    'detect_deficiency': (detect_deficiency, lambda: (frame, leaf_contour)),
+                    # El cuadro completo por el núcleo: vista previa y captura (referencia, hoja, refinamiento y deficiencias)
+                    'analyze (vista previa)': (analyzer.analyze, lambda: (frame,)),
+                    'analyze (captura)': (analyzer.analyze, lambda: (frame, True)),
+                    'annotate': (annotate, lambda: (frame.copy(), preview)),
+                    # Todas las hojas del cuadro con área y desglose de deficiencias de cada una
+                    'measure_leaves (todas)': (measure_leaves, lambda: (frame, settings.classifier, analyzer.reference_area_pixels)),
+                    'save_image_with_metadata': (save_image_submit, after_write),
+                    'image_writer (hilo)': (write_image, lambda: (frame,)),
+                    'save_data (append)': (store.append, lambda: (next_row(),)),
+                }
+                for name, (stage, prepare) in stages.items():
+                    result = measure(stage, prepare, repeat, warmup)
+                    result.update({'stage': name, 'resolution': f"{width}x{height}", 'leaves': leaves})
+                    if name == 'detect_leaf':
+                        result['area_error'] = area_error
+                    results.append(result)
+                writer.close()
+                # La exportación a Excel ocurre una vez por sesión; se mide con las filas ya agregadas
+                result = measure(store.export_excel, lambda: (os.path.join(folder, 'export.xlsx'),), max(3, repeat // 10), 1, 1)
+                result.update({'stage': f"export_excel ({store.count} filas)", 'resolution': f"{width}x{height}", 'leaves': leaves})
+                results.append(result)
+    return results
+
+def print_results(results):
+    header = f"{'resolución':>10} {'hojas':>5}  {'etapa':<34} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'op/s':>9} {'pico KiB':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['resolution']:>10} {r['leaves']:>5}  {r['stage']:<34} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['ops_per_s']:>9.1f} {r['peak_kib']:>9.0f}")
+    print()
+    print("Error del área de la hoja frente a la detección a resolución completa (vista previa reducida / refinada al capturar):")
+    for r in results:
+        if 'area_error' in r:
+            print(f"{r['resolution']:>10} {r['leaves']:>5}  {r['area_error']['preview']:+.3%} / {r['area_error']['refined']:+.3%}")
+
+def parse_resolutions(text):
+    return [tuple(int(v) for v in item.split('x')) for item in text.split(',')]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banco de pruebas de rendimiento con hojas sintéticas")
+    parser.add_argument('--resolutions', default='640x480,1280x720,1920x1080')
+    parser.add_argument('--leaves', default='1,4', help="Números de hojas por cuadro, separados por comas")
+    parser.add_argument('--lesions', type=int, default=3, help="Manchas por hoja")
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--json', help="Guardar los resultados en un archivo JSON")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(parse_resolutions(args.resolutions), [int(n) for n in args.leaves.split(',')], args.repeat, args.warmup, args.lesions)
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'opencv': cv2.__version__, 'numpy': np.__version__, 'cpu_count': os.cpu_count(), 'results': results}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,208 @@
+##Calibración por lotes de los rangos HSV de cada deficiencia a partir de muestras etiquetadas.
+##Reemplaza el ciclo manual de Prueba.py (un polígono a la vez, mínimo y máximo, copiar y pegar):
+##se leen todas las muestras, se junta el histograma HSV de cada clase y se eligen rangos por
+##percentiles, probando varios recortes de las colas y quedándose con el que conserva más píxeles
+##propios y menos de las demás clases. El resultado es un archivo JSON versionado que carga
+##configuracion.py (deficiencias.apply_calibration): el general, o el propio de un programa con --program.
+##
+##Formatos de muestras aceptados dentro de la carpeta:
+##  - Polígonos de LabelMe: imagen + .json con "shapes": [{"label": "Nitrógeno (N)", "points": [[x, y], ...]}]
+##  - Máscaras por clase: <clase>/<imagen>.png con <clase>/<imagen>_mask.png (blanco = píxeles de la clase);
+##    sin máscara se usa toda la imagen (recortes de la mancha)
+##    (las carpetas con .json de LabelMe no se leen como carpetas de máscaras)
+##Las clases que no son deficiencias (p. ej. "sana" o "fondo") sólo sirven como ejemplos negativos.
+##El tono es circular: si una clase cae alrededor del rojo (cerca de 0 y de 179), su rango da la vuelta
+##(mínimo mayor que el máximo, p. ej. 172-6), como lo entiende deficiencias.DeficiencyClassifier.
+##
+##Uso: python calibracion.py muestras [-o calibracion_hsv.json] [--names "Nitrógeno (N)" "Fósforo (P)" ...]
+##     python calibracion.py muestras --program Hojas  (al archivo de calibración propio de Hojas.py, ver configuracion.json)
+
+import argparse
+import datetime
+import glob
+import json
+import os
+
+import cv2
+import numpy as np
+
+from configuracion import load_settings
+from deficiencias import CALIBRATION_VERSION, HUE_RANGE
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+# Recortes de cada cola (en %) que se prueban para cada clase
+TAIL_CANDIDATES = (0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Lee la imagen con rutas que tengan acentos (cv2.imread no las abre en Windows); None si no existe o no se puede leer
+def read_image(path, flags=cv2.IMREAD_COLOR):
+    try:
+        data = np.fromfile(path, dtype=np.uint8)
+    except OSError:
+        return None
+    return cv2.imdecode(data, flags) if data.size else None
+
+# Píxeles HSV (N x 3, uint8) de una imagen dentro de una máscara
+def masked_hsv(image, mask):
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    return hsv[mask > 0]
+
+def labelme_samples(json_path):
+    try:
+        with open(json_path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print("No se pudo leer", json_path, e)
+        return
+    # Otros .json en la carpeta (p. ej. una calibración anterior) no son anotaciones de LabelMe
+    if not isinstance(data, dict) or 'shapes' not in data:
+        return
+    image_path = os.path.join(os.path.dirname(json_path), data.get('imagePath') or os.path.splitext(os.path.basename(json_path))[0] + '.png')
+    image = read_image(image_path)
+    if image is None:
+        print("No se pudo leer", image_path)
+        return
+    # Todas las figuras de una misma clase en una sola máscara
+    masks = {}
+    for shape in data.get('shapes', []):
+        points = np.round(np.array(shape['points'], dtype=np.float64)).astype(np.int32)
+        if len(points) < 3:
+            continue
+        mask = masks.setdefault(shape['label'], np.zeros(image.shape[:2], dtype=np.uint8))
+        cv2.fillPoly(mask, [points], 255)
+    for label, mask in masks.items():
+        yield label, masked_hsv(image, mask)
+
+def mask_samples(folder):
+    for class_dir in sorted(os.scandir(folder), key=lambda e: e.name):
+        if not class_dir.is_dir() or glob.glob(os.path.join(class_dir.path, '*.json')):
+            continue
+        for path in sorted(glob.glob(os.path.join(class_dir.path, '*'))):
+            name, extension = os.path.splitext(path)
+            if extension.lower() not in IMAGE_EXTENSIONS or name.endswith('_mask'):
+                continue
+            image = read_image(path)
+            if image is None:
+                print("No se pudo leer", path)
+                continue
+            mask_paths = [name + '_mask' + ext for ext in IMAGE_EXTENSIONS if os.path.exists(name + '_mask' + ext)]
+            if mask_paths:
+                mask = read_image(mask_paths[0], cv2.IMREAD_GRAYSCALE)
+            else:
+                mask = np.full(image.shape[:2], 255, dtype=np.uint8)
+            yield class_dir.name, masked_hsv(image, mask)
+
+# Junta los píxeles HSV de cada clase: {clase: arreglo N x 3}
+def collect_samples(folder):
+    pixels = {}
+    for json_path in sorted(glob.glob(os.path.join(folder, '**', '*.json'), recursive=True)):
+        for label, hsv in labelme_samples(json_path):
+            pixels.setdefault(label, []).append(hsv)
+    for label, hsv in mask_samples(folder):
+        pixels.setdefault(label, []).append(hsv)
+    return {label: np.concatenate(chunks) for label, chunks in pixels.items() if sum(len(c) for c in chunks)}
+
+# Histograma de 256 valores por canal (3 x 256) en una sola llamada a bincount
+def channel_histograms(hsv):
+    offsets = np.array([0, 256, 512])
+    return np.bincount((hsv.astype(np.int64) + offsets).ravel(), minlength=768).reshape(3, 256)
+
+# Tono donde conviene "cortar" el círculo: el centro del hueco más largo sin píxeles (o el tono menos frecuente)
+def hue_cut(hue_histogram):
+    counts = hue_histogram[:HUE_RANGE]
+    # El círculo se recorre dos veces para encontrar también el hueco que cruza 179 -> 0
+    best_start, best_length, length = 0, 0, 0
+    for index, is_empty in enumerate(np.concatenate([counts == 0, counts == 0])):
+        length = length + 1 if is_empty else 0
+        if length > best_length:
+            best_start, best_length = index - length + 1, length
+    if best_length == 0:
+        return int(np.argmin(counts))
+    return (best_start + min(best_length, HUE_RANGE) // 2) % HUE_RANGE
+
+# Rango [min, max] por canal que deja fuera `tail` % de los píxeles en cada extremo.
+# El tono se mide a partir de hue_cut, así que su rango puede dar la vuelta (min > max)
+def percentile_range(histograms, tail):
+    cut = hue_cut(histograms[0])
+    histograms = histograms.copy()
+    histograms[0, :HUE_RANGE] = np.roll(histograms[0, :HUE_RANGE], -cut)
+    cumulative = np.cumsum(histograms, axis=1) / histograms.sum(axis=1, keepdims=True)
+    lower = np.argmax(cumulative > tail / 100, axis=1)
+    upper = np.argmax(cumulative >= 1 - tail / 100, axis=1)
+    lower[0] = (lower[0] + cut) % HUE_RANGE
+    upper[0] = (upper[0] + cut) % HUE_RANGE
+    return lower, upper
+
+def inside(hsv, lower, upper):
+    within = (hsv >= lower) & (hsv <= upper)
+    if lower[0] > upper[0]:
+        within[:, 0] = (hsv[:, 0] >= lower[0]) | (hsv[:, 0] <= upper[0])
+    return np.all(within, axis=1)
+
+# Para cada deficiencia prueba los recortes de TAIL_CANDIDATES y elige el que maximiza
+# (fracción de píxeles propios dentro) - overlap_weight * (mayor fracción de otra clase dentro)
+def calibrate(pixels, names, overlap_weight=2.0, max_samples=200000, seed=0):
+    rng = np.random.default_rng(seed)
+    # Se submuestrea cada clase para que evaluar los candidatos no dependa del tamaño del lote
+    sampled = {label: hsv[rng.choice(len(hsv), max_samples, replace=False)] if len(hsv) > max_samples else hsv
+               for label, hsv in pixels.items()}
+    ranges = {}
+    for name in names:
+        histograms = channel_histograms(pixels[name])
+        best = None
+        for tail in TAIL_CANDIDATES:
+            lower, upper = percentile_range(histograms, tail)
+            recall = float(inside(sampled[name], lower, upper).mean())
+            overlap = {label: float(inside(hsv, lower, upper).mean()) for label, hsv in sampled.items() if label != name}
+            worst = max(overlap.values(), default=0.0)
+            score = recall - overlap_weight * worst
+            if best is None or score > best['score']:
+                best = {'score': score, 'tail': tail, 'color_range': [lower.tolist(), upper.tolist()],
+                        'recall': recall, 'overlap': overlap}
+        best['pixels'] = int(len(pixels[name]))
+        ranges[name] = best
+    return ranges
+
+def write_calibration(path, ranges, source):
+    data = {
+        'version': CALIBRATION_VERSION,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'source': os.path.abspath(source),
+        'deficiencies': {name: {'color_range': r['color_range'], 'tail_percent': r['tail'], 'pixels': r['pixels'],
+                                'recall': round(r['recall'], 4), 'overlap': {k: round(v, 4) for k, v in r['overlap'].items()}}
+                         for name, r in ranges.items()},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibración de rangos HSV de deficiencias a partir de muestras etiquetadas")
+    parser.add_argument('samples', help="Carpeta con polígonos de LabelMe o carpetas de máscaras por clase")
+    parser.add_argument('-o', '--output', help="Archivo de salida (por defecto, el del programa en configuracion.json)")
+    parser.add_argument('--program', help="Programa con calibración propia (p. ej. Hojas); por defecto, la general")
+    parser.add_argument('--names', nargs='*', help="Clases que son deficiencias (por defecto, todas menos 'sana' y 'fondo')")
+    parser.add_argument('--overlap-weight', type=float, default=2.0, help="Penalización por píxeles de otras clases dentro del rango")
+    args = parser.parse_args(argv)
+    args.output = args.output or load_settings().calibration_file(args.program)
+
+    pixels = collect_samples(args.samples)
+    if not pixels:
+        print("No se encontraron muestras en", args.samples)
+        return 1
+    names = args.names or [label for label in pixels if label.lower() not in ('sana', 'fondo')]
+    missing = [name for name in names if name not in pixels]
+    if missing:
+        print("Sin muestras para:", ', '.join(missing))
+        return 1
+
+    ranges = calibrate(pixels, names, args.overlap_weight)
+    for name, r in ranges.items():
+        worst = max(r['overlap'].values(), default=0.0)
+        print(f"{name}: {r['color_range'][0]} - {r['color_range'][1]}  (colas {r['tail']}%, {r['pixels']} píxeles, "
+              f"propios {r['recall']:.1%}, mayor traslape {worst:.1%})")
+    write_calibration(args.output, ranges, args.samples)
+    print("Calibración guardada en", args.output)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
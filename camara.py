@@ -0,0 +1,213 @@
+##Sesión de cámara persistente.
+##La cámara se abre una sola vez, se deja que ajuste la exposición automática (calentamiento) y un
+##hilo sigue leyendo cuadros en segundo plano: latest_frame() devuelve el último sin esperar, en lugar
+##de pagar varios segundos por abrir el dispositivo en cada captura.
+##
+##  Camera(3)            -> cámara por índice
+##  Camera('hoja.png')   -> imagen fija (una copia del mismo cuadro a still_fps), para pruebas sin cámara
+##  Camera('video.mp4')  -> video en bucle, al ritmo de sus cuadros por segundo
+
+import os
+import threading
+import time
+
+import cv2
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+# Un número (o texto con un número) es un índice de cámara; cualquier otra cosa, una ruta o URL
+def parse_source(source):
+    if isinstance(source, str) and source.strip().isdigit():
+        return int(source)
+    return source
+
+class Camera:
+    # warmup_frames: máximo de cuadros que se descartan mientras la exposición se estabiliza
+    # warmup_timeout: tiempo máximo del calentamiento en segundos
+    # settle: diferencia de brillo medio (0-255) entre cuadros seguidos para considerar estable la exposición
+    # still_fps: cuadros por segundo que entrega read() con una imagen fija (como una cámara, no tan rápido como se pida)
+    def __init__(self, source=0, warmup_frames=30, warmup_timeout=3.0, settle=1.0, still_fps=30):
+        self.source = parse_source(source)
+        self.warmup_frames = warmup_frames
+        self.warmup_timeout = warmup_timeout
+        self.settle = settle
+        self.still_period = 1.0 / still_fps if still_fps else 0.0
+        self.next_still_at = 0.0
+        self.cap = None
+        self.still = None
+        self.frame = None
+        self.sequence = 0
+        self.captured_at = None
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.open_seconds = None
+        self.warmup_seconds = None
+        self.warmup_discarded = 0
+        self.read_errors = 0
+        self.started_at = None
+
+    @property
+    def is_device(self):
+        return isinstance(self.source, int)
+
+    def is_opened(self):
+        return self.still is not None or (self.cap is not None and self.cap.isOpened())
+
+    def open(self):
+        start = time.perf_counter()
+        if not self.is_device and os.path.splitext(str(self.source))[1].lower() in IMAGE_EXTENSIONS:
+            self.still = cv2.imread(self.source)
+            if self.still is None:
+                raise IOError(f"No se pudo leer la imagen {self.source}")
+        else:
+            self.cap = cv2.VideoCapture(self.source)
+            if not self.cap.isOpened():
+                raise IOError(f"No se pudo abrir la cámara o el video {self.source}")
+        self.open_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if self.is_device:
+            self._warm_up()
+        elif self.cap is not None:
+            # Un video no necesita calentamiento; se lee el primer cuadro para que latest_frame() ya tenga uno
+            ret, frame = self.cap.read()
+            if ret:
+                self._publish(frame)
+        self.warmup_seconds = time.perf_counter() - start
+
+        self.running = True
+        self.started_at = time.perf_counter()
+        if self.still is not None:
+            # Una imagen fija no necesita hilo: siempre es el mismo cuadro
+            self._publish(self.still)
+            return self
+        self.thread = threading.Thread(target=self._grab_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    # Descarta cuadros hasta que el brillo medio deja de cambiar (la exposición automática se asentó)
+    def _warm_up(self):
+        deadline = time.perf_counter() + self.warmup_timeout
+        last_brightness = None
+        stable = 0
+        while self.warmup_discarded < self.warmup_frames and time.perf_counter() < deadline:
+            ret, frame = self.cap.read()
+            if not ret:
+                continue
+            self.warmup_discarded += 1
+            self._publish(frame)
+            brightness = cv2.mean(frame)[0]
+            if last_brightness is not None and abs(brightness - last_brightness) < self.settle:
+                stable += 1
+                if stable >= 3:
+                    break
+            else:
+                stable = 0
+            last_brightness = brightness
+
+    def _publish(self, frame):
+        with self.condition:
+            self.frame = frame
+            self.sequence += 1
+            self.captured_at = time.perf_counter()
+            self.condition.notify_all()
+
+    def _grab_loop(self):
+        # Los videos se leen a su velocidad normal y vuelven a empezar al terminar
+        period = 0.0
+        if not self.is_device:
+            fps = self.cap.get(cv2.CAP_PROP_FPS)
+            period = 1.0 / fps if fps and fps > 0 else 1.0 / 30
+        while self.running:
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                if not self.is_device and self.cap.get(cv2.CAP_PROP_POS_FRAMES) > 0:
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                else:
+                    self.read_errors += 1
+                    time.sleep(0.01)
+                continue
+            self._publish(frame)
+            if period:
+                time.sleep(max(0.0, period - (time.perf_counter() - start)))
+
+    # Último cuadro leído, sin esperar: (ret, frame). Los cuadros de una cámara o video no se reutilizan después;
+    # la imagen fija es siempre el mismo arreglo, así que se entrega una copia (quien la recibe puede dibujar encima)
+    def latest_frame(self):
+        with self.condition:
+            if self.still is not None:
+                return True, self.still.copy()
+            return self.frame is not None, self.frame
+
+    # Como cap.read(): espera un cuadro más nuevo que el último disponible al llamar.
+    # Con una imagen fija espera al siguiente período de still_fps y devuelve una copia
+    def read(self, timeout=1.0):
+        with self.condition:
+            if self.still is not None:
+                return self._read_still(timeout)
+            sequence = self.sequence
+            self.condition.wait_for(lambda: self.sequence > sequence or not self.running, timeout)
+            if self.sequence == sequence:
+                return False, None
+            return True, self.frame
+
+    # Se llama con self.condition tomado; cada lector reserva el siguiente período
+    def _read_still(self, timeout):
+        deadline = time.perf_counter() + timeout
+        while self.running:
+            now = time.perf_counter()
+            if now >= self.next_still_at:
+                self.next_still_at = max(self.next_still_at, now) + self.still_period
+                self.sequence += 1
+                return True, self.still.copy()
+            self.condition.wait_for(lambda: not self.running, min(self.next_still_at, deadline) - now)
+            if time.perf_counter() >= deadline:
+                break
+        return False, None
+
+    def release(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(1.0)
+        if self.cap is not None:
+            self.cap.release()
+
+    def __enter__(self):
+        return self if self.running else self.open()
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            'source': self.source,
+            'open_ms': self.open_seconds * 1000 if self.open_seconds is not None else None,
+            'warmup_ms': self.warmup_seconds * 1000 if self.warmup_seconds is not None else None,
+            'warmup_frames': self.warmup_discarded,
+            'frames': self.sequence,
+            'fps': self.sequence / elapsed if elapsed else 0.0,
+            'read_errors': self.read_errors,
+        }
+
+# Una sola sesión por fuente en todo el proceso: la primera llamada abre la cámara y las siguientes la reutilizan
+_cameras = {}
+_cameras_lock = threading.Lock()
+
+def shared_camera(source=0, **options):
+    source = parse_source(source)
+    with _cameras_lock:
+        camera = _cameras.get(source)
+        if camera is None or not camera.running:
+            camera = _cameras[source] = Camera(source, **options).open()
+        return camera
+
+def release_cameras():
+    with _cameras_lock:
+        for camera in _cameras.values():
+            camera.release()
+        _cameras.clear()
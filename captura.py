@@ -0,0 +1,159 @@
+##Captura y procesamiento en hilos, separados del ciclo de eventos de Tk.
+##Un hilo lee la cámara y deja los cuadros en una cola acotada; un hilo de trabajo los procesa
+##y guarda sólo el resultado más reciente, que la interfaz dibuja cuando le toca.
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+# Políticas cuando la cola de cuadros está llena
+DROP_OLDEST = 'oldest'  # gana el cuadro más reciente: se descarta el más viejo de la cola
+DROP_NEWEST = 'newest'  # se descarta el cuadro que acaba de llegar
+BLOCK = 'block'         # la captura espera a que haya lugar (no se pierde ningún cuadro)
+
+class FrameQueue:
+    def __init__(self, maxsize=1, drop_policy=DROP_OLDEST):
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError(f"Política de descarte desconocida: {drop_policy}")
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self.items = collections.deque()
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    # Devuelve False si el cuadro no entró en la cola
+    def put(self, item):
+        with self.condition:
+            while len(self.items) >= self.maxsize and not self.closed:
+                if self.drop_policy == DROP_OLDEST:
+                    self.items.popleft()
+                    self.dropped += 1
+                elif self.drop_policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                else:
+                    self.condition.wait()
+            if self.closed:
+                return False
+            self.items.append(item)
+            self.condition.notify_all()
+            return True
+
+    # Devuelve None si se agota el tiempo o la cola se cerró
+    def get(self, timeout=None):
+        with self.condition:
+            self.condition.wait_for(lambda: self.items or self.closed, timeout)
+            if not self.items:
+                return None
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+class CapturePipeline:
+    # read_frame: función sin argumentos que devuelve (ret, frame), p. ej. cap.read
+    # process: función que recibe un cuadro y devuelve el resultado que mostrará la interfaz
+    # workers: hilos que llaman a process a la vez (más de uno sólo si process lo permite, p. ej. con procesos.ProcessAnalysisPool)
+    # keep: función resultado -> bool; esos resultados (p. ej. las capturas) se guardan aparte hasta que la interfaz
+    #       los pida con kept_results(), para que un cuadro posterior no los reemplace antes de que se lean
+    def __init__(self, read_frame, process, queue_size=1, drop_policy=DROP_OLDEST, latency_window=200, workers=1, keep=None):
+        self.read_frame = read_frame
+        self.process = process
+        self.keep = keep
+        self.kept = collections.deque()
+        self.frames = FrameQueue(queue_size, drop_policy)
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.latest = None
+        self.processing_latencies = collections.deque(maxlen=latency_window)
+        self.display_latencies = collections.deque(maxlen=latency_window)
+        self.captured = 0
+        self.processed = 0
+        self.running = False
+        self.threads = []
+        self.started_at = None
+
+    def start(self):
+        self.running = True
+        self.started_at = time.perf_counter()
+        self.threads = [threading.Thread(target=self._capture_loop, daemon=True)]
+        self.threads += [threading.Thread(target=self._process_loop, daemon=True) for _ in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        self.frames.close()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def _capture_loop(self):
+        while self.running:
+            ret, frame = self.read_frame()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            self.captured += 1
+            self.frames.put((self.captured, time.perf_counter(), frame))
+
+    def _process_loop(self):
+        while self.running:
+            item = self.frames.get(timeout=0.1)
+            if item is None:
+                continue
+            sequence, captured_at, frame = item
+            try:
+                result = self.process(frame)
+            except Exception as e:
+                print("Error al procesar el cuadro:", e)
+                continue
+            with self.lock:
+                self.processing_latencies.append(time.perf_counter() - captured_at)
+                self.processed += 1
+                # Con varios hilos un cuadro puede terminar después de uno más nuevo: no reemplaza al más reciente
+                if self.latest is None or sequence > self.latest[0]:
+                    self.latest = (sequence, captured_at, result)
+                if self.keep is not None and self.keep(result):
+                    self.kept.append(result)
+
+    # Último resultado (sequence, captured_at, result) si es más nuevo que after_sequence; si no, None
+    def latest_result(self, after_sequence=0):
+        with self.lock:
+            if self.latest is None or self.latest[0] <= after_sequence:
+                return None
+            return self.latest
+
+    # Resultados guardados por keep desde la última llamada, en el orden en que terminaron
+    def kept_results(self):
+        with self.lock:
+            results = list(self.kept)
+            self.kept.clear()
+            return results
+
+    # La interfaz avisa cuando dibujó un cuadro, para medir la latencia de extremo a extremo
+    def mark_displayed(self, captured_at):
+        with self.lock:
+            self.display_latencies.append(time.perf_counter() - captured_at)
+
+    def stats(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+            processing = np.array(self.processing_latencies) * 1000
+            display = np.array(self.display_latencies) * 1000
+            return {
+                'captured': self.captured,
+                'processed': self.processed,
+                'dropped': self.frames.dropped,
+                'capture_fps': self.captured / elapsed if elapsed else 0.0,
+                'processing_fps': self.processed / elapsed if elapsed else 0.0,
+                'processing_latency_ms': float(np.median(processing)) if processing.size else None,
+                'latency_ms': float(np.median(display)) if display.size else None,
+                'latency_ms_p95': float(np.percentile(display, 95)) if display.size else None,
+            }
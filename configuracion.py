@@ -0,0 +1,156 @@
+##Configuración compartida de todos los programas (configuracion.json).
+##Tabla de deficiencias, cámaras, puertos serie, umbrales y tiempos de espera en un solo archivo que se
+##lee una vez al iniciar. Las estructuras que usa cada cuadro (la tabla de deficiencias y la tabla LUT
+##del clasificador) se construyen al cargar y no se modifican después: una recarga crea estructuras nuevas
+##y las reemplaza de una sola vez, así el hilo de procesamiento nunca ve una a medias.
+##Los rangos de color se pueden recargar sin reiniciar la captura (reload_colors / maybe_reload).
+##
+##Cada programa puede tener sus propios rangos ("color_ranges": {"Hojas": {...}}) y su propio archivo de
+##calibración ("calibration": {"Hojas": "calibracion_hsv_hojas.json"}); settings.colors('Hojas') devuelve
+##sus tablas. Sin entrada, un programa usa la tabla general y calibracion_hsv.json.
+
+import collections
+import json
+import os
+import threading
+import time
+import types
+
+from deficiencias import CALIBRATION_FILE, DeficiencyClassifier, apply_calibration
+from protocolo import deficiency_codes
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'configuracion.json')
+CONFIG_VERSION = 1
+
+# Tablas de color de un programa: deficiencias con sus rangos y clasificador
+ColorTables = collections.namedtuple('ColorTables', ['deficiency_info', 'classifier'])
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return types.MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+class Settings:
+    def __init__(self, path=CONFIG_FILE, calibration_path=CALIBRATION_FILE):
+        self.path = path
+        self.calibration_path = calibration_path
+        self.lock = threading.Lock()
+        self.last_check = 0.0
+        data = self._read()
+        self.data = _freeze(data)
+        self.cameras = self.data.get('cameras', {})
+        self.models = self.data.get('models', {})
+        self.camera_options = self.data.get('camera', {})
+        self.embedded = self.data.get('embedded', {})
+        self.analysis = self.data.get('analysis', {})
+        self.thresholds = self.data.get('thresholds', {})
+        self.names = tuple(data['deficiencies'])
+        # Código de cada deficiencia en el protocolo binario; como los nombres, no cambia sin reiniciar
+        self.deficiency_code = types.MappingProxyType(deficiency_codes(self.names))
+        self.tables = {None: None}
+        self._build_colors(data)
+
+    def _read(self):
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version', 0) > CONFIG_VERSION:
+            raise ValueError(f"{self.path} tiene la versión {data.get('version')}; este programa sólo entiende hasta la {CONFIG_VERSION}")
+        return data
+
+    # Archivo de calibración de un programa (el general si no tiene uno propio en "calibration")
+    def calibration_file(self, program=None):
+        path = self.data.get('calibration', {}).get(program)
+        if path is None:
+            return self.calibration_path
+        return os.path.join(os.path.dirname(os.path.abspath(self.path)), path)
+
+    # Tabla de deficiencias de un programa (con sus rangos y su calibración aplicados) y clasificador
+    def _build_tables(self, data, program):
+        info = {name: dict(entry) for name, entry in data['deficiencies'].items()}
+        for name, color_range in data.get('color_ranges', {}).get(program, {}).items():
+            if name in info:
+                info[name]['color_range'] = color_range
+        apply_calibration(info, self.calibration_file(program))
+        return ColorTables(_freeze(info), DeficiencyClassifier(info))
+
+    def _file_mtimes(self):
+        return (_mtime(self.path),) + tuple(_mtime(self.calibration_file(program)) for program in self.tables)
+
+    # Tablas listas para usarse en cada cuadro, de la configuración general y de cada programa que las pidió
+    def _build_colors(self, data):
+        tables = {program: self._build_tables(data, program) for program in self.tables}
+        # Se reemplaza todo junto: quien lea settings.classifier obtiene una versión completa, vieja o nueva
+        self.tables = tables
+        self.deficiency_info, self.classifier = tables[None]
+        self.mtimes = self._file_mtimes()
+
+    # Tablas de color de un programa; se construyen la primera vez y se recargan con reload_colors
+    def colors(self, program=None):
+        tables = self.tables.get(program)
+        if tables is None:
+            with self.lock:
+                if program not in self.tables:
+                    tables = dict(self.tables)
+                    tables[program] = self._build_tables(self._read(), program)
+                    self.tables = tables
+                    self.mtimes = self._file_mtimes()
+                tables = self.tables[program]
+        return tables
+
+    def camera(self, program, default=0):
+        return self.cameras.get(program, default)
+
+    # Archivo del modelo de un programa (.h5/.keras, .onnx o .tflite; ver modelo.py)
+    def model(self, program, default=None):
+        return self.models.get(program, default)
+
+    # Opciones del puerto serie de un programa: port, baudrate y reset_delay
+    def serial(self, program):
+        return dict(self.data.get('serial', {}).get(program, {}))
+
+    def threshold(self, name, default=None):
+        return self.thresholds.get(name, default)
+
+    # Vuelve a leer los rangos de color si cambió configuracion.json o la calibración. Las deficiencias
+    # (nombres y orden) no cambian sin reiniciar, porque de ellas dependen los códigos del protocolo serie.
+    def reload_colors(self):
+        with self.lock:
+            if self._file_mtimes() == self.mtimes:
+                return False
+            try:
+                data = self._read()
+            except (OSError, ValueError) as e:
+                print("No se pudo recargar la configuración:", e)
+                return False
+            if tuple(data['deficiencies']) != self.names:
+                print("Las deficiencias de la configuración cambiaron; se necesita reiniciar para usarlas")
+                self.mtimes = self._file_mtimes()
+                return False
+            self._build_colors(data)
+            print("Rangos de color recargados")
+            return True
+
+    # Para llamar con frecuencia (p. ej. desde el ciclo de la interfaz): revisa los archivos a lo más cada `interval` s
+    def maybe_reload(self, interval=2.0):
+        now = time.monotonic()
+        if now - self.last_check < interval:
+            return False
+        self.last_check = now
+        return self.reload_colors()
+
+_settings = None
+
+# Configuración del proceso; se lee la primera vez que se pide
+def load_settings():
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+    return _settings
@@ -0,0 +1,131 @@
+##Controlador asíncrono del sistema embebido.
+##La lectura del puerto serie, la captura, la clasificación y el envío de resultados son tareas
+##independientes unidas por colas acotadas: un disparo que llega mientras se procesa o se transmite
+##la hoja anterior queda en cola en lugar de perderse, y la clasificación de la hoja N se solapa con
+##la transmisión de la hoja N-1. Las llamadas bloqueantes (puerto, cámara, OpenCV) corren en hilos.
+##Un error al clasificar o enviar una hoja se cuenta y se informa, y el controlador sigue con la siguiente;
+##si una tarea termina por un error (p. ej. el puerto se cerró), run() termina con ese error.
+
+import asyncio
+import time
+
+# Marca en la cola de envío de una hoja que no se pudo capturar o clasificar
+FAILED = object()
+
+class EmbeddedController:
+    # transport: transporte de transporte.py
+    # read_frame: función sin argumentos que devuelve (ret, frame), p. ej. cap.read
+    # classify: función frame -> resultado
+    # format_result: función (resultado, número de secuencia) -> bytes a enviar al Arduino
+    # capture_delay: espera entre el disparo y la foto (la hoja tarda en llegar a la cámara)
+    # format_error: función (número de secuencia) -> bytes que se envían si la hoja no se pudo capturar o
+    #               clasificar, para que el Arduino no se quede esperando (None: no se responde)
+    def __init__(self, transport, read_frame, classify, format_result, trigger='e', capture_delay=1.0, queue_size=8, format_error=None):
+        self.transport = transport
+        self.read_frame = read_frame
+        self.classify = classify
+        self.format_result = format_result
+        self.format_error = format_error
+        self.trigger = trigger
+        self.capture_delay = capture_delay
+        self.queue_size = queue_size
+        self.triggers = 0
+        self.dropped = 0
+        self.sent = 0
+        self.capture_errors = 0
+        self.classify_errors = 0
+        self.send_errors = 0
+        self.latencies = []
+        self.loop = None
+        self.stop_event = None
+
+    async def _read_serial(self, trigger_queue):
+        while True:
+            line = await asyncio.to_thread(self.transport.readline)
+            if line.decode(errors='ignore').strip() != self.trigger:
+                continue
+            self.triggers += 1
+            try:
+                trigger_queue.put_nowait((self.triggers, time.perf_counter()))
+            except asyncio.QueueFull:
+                self.dropped += 1
+                print(f"Cola de disparos llena: se descartó el disparo {self.triggers}")
+
+    async def _capture(self, trigger_queue, frame_queue, send_queue):
+        while True:
+            sequence, triggered_at = await trigger_queue.get()
+            # Se espera hasta capture_delay después del disparo, sin bloquear las demás tareas
+            await asyncio.sleep(max(0.0, triggered_at + self.capture_delay - time.perf_counter()))
+            ret, frame = await asyncio.to_thread(self.read_frame)
+            if not ret:
+                self.capture_errors += 1
+                print("Error al capturar la imagen.")
+                await send_queue.put((sequence, triggered_at, FAILED))
+                continue
+            await frame_queue.put((sequence, triggered_at, frame))
+
+    async def _classify(self, frame_queue, send_queue):
+        while True:
+            sequence, triggered_at, frame = await frame_queue.get()
+            try:
+                result = await asyncio.to_thread(self.classify, frame)
+            except Exception as e:
+                self.classify_errors += 1
+                print(f"Error al clasificar la hoja {sequence}:", e)
+                result = FAILED
+            await send_queue.put((sequence, triggered_at, result))
+
+    async def _write_serial(self, send_queue):
+        while True:
+            sequence, triggered_at, result = await send_queue.get()
+            if result is FAILED and self.format_error is None:
+                continue
+            try:
+                data = self.format_error(sequence) if result is FAILED else self.format_result(result, sequence)
+                await asyncio.to_thread(self.transport.write, data)
+            except Exception as e:
+                self.send_errors += 1
+                print(f"Error al enviar el resultado {sequence}:", e)
+                continue
+            self.sent += 1
+            self.latencies.append(time.perf_counter() - triggered_at)
+
+    # Corre hasta que se llame a stop() (o para siempre); si una tarea falla, termina y propaga su error
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        trigger_queue = asyncio.Queue(self.queue_size)
+        frame_queue = asyncio.Queue(self.queue_size)
+        send_queue = asyncio.Queue(self.queue_size)
+        tasks = [asyncio.create_task(self._read_serial(trigger_queue)),
+                 asyncio.create_task(self._capture(trigger_queue, frame_queue, send_queue)),
+                 asyncio.create_task(self._classify(frame_queue, send_queue)),
+                 asyncio.create_task(self._write_serial(send_queue))]
+        stop = asyncio.create_task(self.stop_event.wait())
+        try:
+            done, _ = await asyncio.wait(tasks + [stop], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is not stop:
+                    # Las tareas no terminan solas: si una terminó, fue por un error
+                    task.result()
+        finally:
+            for task in tasks + [stop]:
+                task.cancel()
+            await asyncio.gather(*tasks, stop, return_exceptions=True)
+
+    # Se puede llamar desde cualquier hilo
+    def stop(self):
+        if self.stop_event is not None:
+            self.loop.call_soon_threadsafe(self.stop_event.set)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            'triggers': self.triggers,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'capture_errors': self.capture_errors,
+            'classify_errors': self.classify_errors,
+            'send_errors': self.send_errors,
+            'latency_ms_median': latencies[len(latencies) // 2] * 1000 if latencies else None,
+        }
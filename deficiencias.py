@@ -0,0 +1,108 @@
+##Clasificador de deficiencias en una sola pasada.
+##Cada rango HSV de deficiency_info es una caja [min, max] por canal, así que pertenecer a la caja
+##equivale a cumplir el rango en H, en S y en V. Se precalcula una tabla de 256 entradas por canal con
+##un bit por deficiencia; con cv2.LUT + AND de los tres canales cada píxel queda etiquetado con todas
+##las deficiencias a la vez, y un solo histograma da el conteo de cada una. El costo no crece al
+##agregar K, Mg, Ca, etc. (hasta 16 deficiencias).
+
+import json
+import os
+
+import cv2
+import numpy as np
+
+MAX_DEFICIENCIES = 16
+
+# Valores de tono de OpenCV para imágenes de 8 bits (0-179); el tono es circular
+HUE_RANGE = 180
+
+# Archivo de rangos HSV que escribe calibracion.py; si existe, se usa en lugar de los rangos de configuracion.json
+# (un programa puede tener el suyo: "calibration" en configuracion.json)
+CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calibracion_hsv.json')
+CALIBRATION_VERSION = 1
+
+# Reemplaza los color_range de deficiency_info con los de la calibración (sólo las deficiencias que ya existen;
+# los síntomas y tratamientos siguen en cada programa). Devuelve los datos del archivo, o None si no existe.
+def apply_calibration(deficiency_info, path=CALIBRATION_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version', 0) > CALIBRATION_VERSION:
+        raise ValueError(f"{path} tiene la versión {data.get('version')}; este programa sólo entiende hasta la {CALIBRATION_VERSION}")
+    for name, calibration in data.get('deficiencies', {}).items():
+        if name not in deficiency_info:
+            print(f"Calibración de '{name}' ignorada: no hay síntomas ni tratamiento para esa deficiencia")
+            continue
+        lower, upper = calibration['color_range']
+        deficiency_info[name]['color_range'] = (list(lower), list(upper))
+    return data
+
+# Rasteriza el contorno de la hoja una sola vez: devuelve su recuadro (x, y, w, h) y la máscara
+# del tamaño del recuadro, para analizar sólo los píxeles de la hoja y no el fondo ni las anotaciones
+def leaf_mask(contour):
+    x, y, w, h = cv2.boundingRect(contour)
+    mask = np.zeros((h, w), dtype=np.uint8)
+    cv2.drawContours(mask, [contour], -1, 255, cv2.FILLED, offset=(-x, -y))
+    return (x, y, w, h), mask
+
+class DeficiencyClassifier:
+    def __init__(self, deficiency_info):
+        self.names = list(deficiency_info)
+        if len(self.names) > MAX_DEFICIENCIES:
+            raise ValueError(f"Se admiten hasta {MAX_DEFICIENCIES} deficiencias, se recibieron {len(self.names)}")
+        self.info = deficiency_info
+        self.dtype = np.uint8 if len(self.names) <= 8 else np.uint16
+
+        # Tabla por canal (H, S, V): bit i encendido si el valor está dentro del rango de la deficiencia i.
+        # Un rango de tono con mínimo mayor que el máximo da la vuelta por el rojo (p. ej. 170-5: 170..179 y 0..5)
+        self.lut = np.zeros((1, 256, 3), dtype=self.dtype)
+        for bit, name in enumerate(self.names):
+            lower, upper = deficiency_info[name]['color_range']
+            for channel in range(3):
+                if channel == 0 and lower[0] > upper[0]:
+                    self.lut[0, lower[0]:HUE_RANGE, 0] |= 1 << bit
+                    self.lut[0, :upper[0] + 1, 0] |= 1 << bit
+                else:
+                    self.lut[0, lower[channel]:upper[channel] + 1, channel] |= 1 << bit
+
+        # Matriz código -> deficiencias: membership[code, i] es 1 si el código incluye la deficiencia i
+        codes = np.arange(1 << len(self.names))
+        self.membership = ((codes[:, None] >> np.arange(len(self.names))) & 1).astype(np.int64)
+
+    # Etiqueta cada píxel HSV con el conjunto de deficiencias (un bit por deficiencia)
+    def label_pixels(self, hsv):
+        channels = cv2.split(cv2.LUT(hsv, self.lut))
+        return cv2.bitwise_and(cv2.bitwise_and(channels[0], channels[1]), channels[2])
+
+    # Conteo de píxeles y fracción de cobertura de cada deficiencia; mask limita el análisis (opcional)
+    def breakdown_hsv(self, hsv, mask=None):
+        return self.breakdown_codes(self.label_pixels(hsv), mask)
+
+    # Igual que breakdown_hsv, a partir de las etiquetas de label_pixels (p. ej. las de procesamiento.FrameProcessor)
+    def breakdown_codes(self, codes, mask=None):
+        if self.dtype == np.uint8:
+            hist = cv2.calcHist([codes], [0], mask, [256], [0, 256]).ravel().astype(np.int64)
+        else:
+            selected = codes[mask > 0] if mask is not None else codes.ravel()
+            hist = np.bincount(selected, minlength=1 << 16)
+        hist = hist[:len(self.membership)]
+        total = int(cv2.countNonZero(mask)) if mask is not None else codes.size
+        counts = hist @ self.membership
+        return {name: {'pixels': int(count), 'coverage': count / total if total else 0.0}
+                for name, count in zip(self.names, counts)}
+
+    def breakdown(self, image, mask=None):
+        return self.breakdown_hsv(cv2.cvtColor(image, cv2.COLOR_BGR2HSV), mask)
+
+    # Igual que breakdown, pero convirtiendo a HSV sólo el recuadro de la hoja y contando dentro de su contorno
+    def breakdown_leaf(self, image, leaf_contour):
+        (x, y, w, h), mask = leaf_mask(leaf_contour)
+        return self.breakdown(image[y:y+h, x:x+w], mask)
+
+    # Deficiencia dominante (la de más píxeles) o None si ninguna alcanza min_pixels
+    def dominant(self, breakdown, min_pixels=1):
+        if not self.names:
+            return None
+        name = max(self.names, key=lambda n: breakdown[n]['pixels'])
+        return name if breakdown[name]['pixels'] >= min_pixels else None
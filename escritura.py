@@ -0,0 +1,159 @@
+##Escritura diferida de las capturas.
+##La codificación y la escritura del archivo ocurren en hilos de trabajo, fuera del hilo de Tk.
+##Los datos de la hoja no se dibujan sobre la imagen: se guardan dentro del archivo (fragmento iTXt
+##en PNG, comentario COM en JPEG) o en un archivo .json al lado, y read_metadata() los recupera.
+##Cada archivo se escribe primero con otro nombre y se renombra al terminar, así nunca queda a medias.
+
+import concurrent.futures
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+import cv2
+
+METADATA_KEY = 'hoja'
+
+# Modos de metadatos
+EMBEDDED = 'embedded'  # dentro del archivo de imagen
+SIDECAR = 'sidecar'    # en <imagen>.json
+NONE = 'none'          # sin metadatos
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+# Inserta un fragmento iTXt (texto UTF-8) justo después de la cabecera IHDR
+def png_with_text(encoded, key, text):
+    ihdr_end = 8 + 8 + struct.unpack('>I', encoded[8:12])[0] + 4
+    data = key.encode('latin-1') + b'\x00\x00\x00\x00\x00' + text.encode('utf-8')
+    return encoded[:ihdr_end] + png_chunk(b'iTXt', data) + encoded[ihdr_end:]
+
+# Inserta un comentario COM después del marcador SOI
+def jpeg_with_comment(encoded, text):
+    data = text.encode('utf-8')
+    if len(data) > 65533:
+        raise ValueError("Los metadatos no caben en un comentario JPEG")
+    return encoded[:2] + b'\xff\xfe' + struct.pack('>H', len(data) + 2) + data + encoded[2:]
+
+def sidecar_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+# Metadatos guardados por ImageWriter (en el archivo o en el .json al lado); None si no hay
+def read_metadata(path):
+    if os.path.exists(sidecar_path(path)):
+        with open(sidecar_path(path), encoding='utf-8') as f:
+            return json.load(f)
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        position = 8
+        while position + 8 <= len(data):
+            length, kind = struct.unpack('>I4s', data[position:position + 8])
+            body = data[position + 8:position + 8 + length]
+            if kind == b'iTXt' and body.startswith(METADATA_KEY.encode('latin-1') + b'\x00'):
+                # clave, separador, compresión (2 bytes), idioma y palabra clave traducida terminados en 0
+                text = body.split(b'\x00', 5)[-1]
+                return json.loads(text.decode('utf-8'))
+            if kind == b'IDAT':
+                break
+            position += 12 + length
+    elif data.startswith(b'\xff\xd8') and data[2:4] == b'\xff\xfe':
+        length = struct.unpack('>H', data[4:6])[0]
+        return json.loads(data[6:4 + length].decode('utf-8'))
+    return None
+
+class ImageWriter:
+    # image_format: 'png' o 'jpg'
+    # png_compression: 0-9 (1 es mucho más rápido que el 3 por omisión de OpenCV y casi del mismo tamaño)
+    # metadata: EMBEDDED, SIDECAR o NONE
+    def __init__(self, workers=2, image_format='png', png_compression=1, jpeg_quality=90, metadata=EMBEDDED):
+        if metadata not in (EMBEDDED, SIDECAR, NONE):
+            raise ValueError(f"Modo de metadatos desconocido: {metadata}")
+        self.image_format = image_format.lower().lstrip('.')
+        if self.image_format == 'jpeg':
+            self.image_format = 'jpg'
+        if self.image_format == 'png':
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+        elif self.image_format == 'jpg':
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        else:
+            raise ValueError(f"Formato de imagen no soportado: {image_format}")
+        self.metadata = metadata
+        self.executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='escritura')
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.written = 0
+        self.errors = 0
+        self.write_seconds = 0.0
+
+    @property
+    def extension(self):
+        return '.' + self.image_format
+
+    # Encola la escritura y regresa enseguida. El cuadro no debe modificarse después de entregarlo.
+    def submit(self, frame, path, metadata=None):
+        future = self.executor.submit(self._write, frame, path, metadata)
+        with self.lock:
+            self.pending[os.path.abspath(path)] = future
+        future.add_done_callback(lambda f, key=os.path.abspath(path): self._done(key, f))
+        return future
+
+    def _done(self, key, future):
+        with self.lock:
+            if self.pending.get(key) is future:
+                del self.pending[key]
+            if future.exception() is not None:
+                self.errors += 1
+                print("Error al guardar la imagen:", future.exception())
+
+    def _write(self, frame, path, metadata):
+        start = time.perf_counter()
+        ok, encoded = cv2.imencode(self.extension, frame, self.params)
+        if not ok:
+            raise IOError(f"No se pudo codificar {path}")
+        data = encoded.tobytes()
+        text = json.dumps(metadata, ensure_ascii=False, default=str) if metadata is not None else None
+        if text is not None and self.metadata == EMBEDDED:
+            data = png_with_text(data, METADATA_KEY, text) if self.image_format == 'png' else jpeg_with_comment(data, text)
+        if text is not None and self.metadata == SIDECAR:
+            with open(sidecar_path(path) + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(sidecar_path(path) + '.tmp', sidecar_path(path))
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+        with self.lock:
+            self.written += 1
+            self.write_seconds += time.perf_counter() - start
+        return path
+
+    # Espera a que termine la escritura de un archivo (o de todos si path es None)
+    def wait(self, path=None, timeout=None):
+        with self.lock:
+            if path is None:
+                futures = list(self.pending.values())
+            else:
+                future = self.pending.get(os.path.abspath(path))
+                futures = [future] if future is not None else []
+        concurrent.futures.wait(futures, timeout)
+
+    # Espera las escrituras pendientes de todos los archivos dentro de una carpeta
+    def wait_folder(self, folder, timeout=None):
+        folder = os.path.join(os.path.abspath(folder), '')
+        with self.lock:
+            futures = [future for key, future in self.pending.items() if key.startswith(folder)]
+        concurrent.futures.wait(futures, timeout)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'pending': len(self.pending),
+                'written': self.written,
+                'errors': self.errors,
+                'write_ms_mean': self.write_seconds / self.written * 1000 if self.written else None,
+            }
@@ -0,0 +1,139 @@
+##Servicio de inferencia del modelo (CNN) fuera del hilo de Tk.
+##La interfaz entrega cuadros con submit() y lee el último resultado con latest_result(); un hilo de
+##trabajo junta los cuadros pendientes en un lote y llama al modelo una sola vez por lote, en lugar de
+##pagar el costo fijo de model.predict en cada cuadro. Antes de clasificar se compara una miniatura del
+##cuadro con la del último cuadro clasificado: si la escena no cambió, se conserva el resultado anterior.
+
+import collections
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from captura import FrameQueue, DROP_OLDEST
+
+# Miniatura para comparar cuadros: promedia el ruido del sensor y conserva el color (lo que distingue una deficiencia)
+def thumbnail(frame, size=16):
+    return cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+
+class InferenceService:
+    # preprocess: lista de cuadros -> arreglo del lote que recibe el modelo
+    # predict_batch: lote -> predicciones (una fila por cuadro), p. ej. model.predict_on_batch
+    # batch_size: máximo de cuadros por llamada al modelo
+    # max_wait: segundos que se espera a que lleguen más cuadros para completar el lote
+    # change_threshold: diferencia media (0-255) de la miniatura con el último cuadro clasificado
+    #                   a partir de la cual se vuelve a clasificar
+    def __init__(self, preprocess, predict_batch, batch_size=4, max_wait=0.02, change_threshold=3.0, rate_window=100):
+        self.preprocess = preprocess
+        self.predict_batch = predict_batch
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.change_threshold = change_threshold
+        self.frames = FrameQueue(batch_size, DROP_OLDEST)
+        self.lock = threading.Lock()
+        self.latest = None
+        self.last_thumbnail = None
+        self.batch_times = collections.deque(maxlen=rate_window)
+        self.submitted = 0
+        self.inferred = 0
+        self.batches = 0
+        self.skipped = 0
+        self.running = False
+        self.thread = None
+        self.started_at = None
+
+    def start(self):
+        self.running = True
+        self.started_at = time.perf_counter()
+        self.thread = threading.Thread(target=self._inference_loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        self.frames.close()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    # Entrega un cuadro (no debe modificarse después); si el hilo va atrasado se descartan los más viejos
+    def submit(self, frame):
+        self.submitted += 1
+        return self.frames.put((self.submitted, time.perf_counter(), frame))
+
+    # El primer cuadro se espera sin límite; los siguientes, sólo hasta max_wait
+    def _next_batch(self):
+        item = self.frames.get(timeout=0.1)
+        if item is None:
+            return []
+        batch = [item]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            item = self.frames.get(timeout=remaining) if remaining > 0 else None
+            if item is None:
+                break
+            batch.append(item)
+        return batch
+
+    # Se quitan del lote los cuadros casi iguales al último clasificado
+    def _changed(self, batch):
+        changed = []
+        for item in batch:
+            small = thumbnail(item[2])
+            if self.last_thumbnail is not None and cv2.norm(small, self.last_thumbnail, cv2.NORM_L1) / small.size < self.change_threshold:
+                self.skipped += 1
+                continue
+            self.last_thumbnail = small
+            changed.append(item)
+        return changed
+
+    def _inference_loop(self):
+        while self.running:
+            batch = self._changed(self._next_batch())
+            if not batch:
+                continue
+            start = time.perf_counter()
+            try:
+                predictions = np.asarray(self.predict_batch(self.preprocess([frame for _, _, frame in batch])))
+            except Exception as e:
+                print("Error en la inferencia:", e)
+                continue
+            elapsed = time.perf_counter() - start
+            # Los cuadros de un lote son consecutivos: se promedian para suavizar el ruido entre cuadros
+            probabilities = predictions.mean(axis=0)
+            sequence, captured_at, _ = batch[-1]
+            with self.lock:
+                self.batch_times.append((len(batch), elapsed))
+                self.inferred += len(batch)
+                self.batches += 1
+                self.latest = (sequence, {
+                    'class': int(np.argmax(probabilities)),
+                    'probabilities': probabilities,
+                    'latency_ms': (time.perf_counter() - captured_at) * 1000,
+                })
+
+    # Último resultado (sequence, result) si es más nuevo que after_sequence; si no, None
+    def latest_result(self, after_sequence=0):
+        with self.lock:
+            if self.latest is None or self.latest[0] <= after_sequence:
+                return None
+            return self.latest
+
+    def stats(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+            frames = sum(n for n, _ in self.batch_times)
+            seconds = sum(t for _, t in self.batch_times)
+            return {
+                'submitted': self.submitted,
+                'inferred': self.inferred,
+                'skipped': self.skipped,
+                'dropped': self.frames.dropped,
+                'batches': self.batches,
+                'batch_size_mean': frames / len(self.batch_times) if self.batch_times else None,
+                'inferences_per_s': self.inferred / elapsed if elapsed else 0.0,
+                # Capacidad del modelo: cuadros por segundo de cómputo, sin contar la espera de cuadros
+                'model_frames_per_s': frames / seconds if seconds else None,
+                'batch_ms_mean': seconds / len(self.batch_times) * 1000 if self.batch_times else None,
+            }
@@ -0,0 +1,157 @@
+##Análisis por lotes (sin interfaz gráfica) de carpetas con fotos de hojas.
+##Usa el mismo núcleo que Sistema.py (analisis.py, sin tkinter): referencia -> hoja -> área -> deficiencia,
+##repartiendo las imágenes entre varios procesos y escribiendo una sola tabla de resultados.
+##
+##Con --multi se miden todas las hojas de cada foto (una fila por hoja, Filename "<foto>#<número>").
+##
+##Uso: python lote.py carpeta_o_patron [-o resultados.csv] [-j procesos] [-r] [--multi]
+
+import argparse
+import datetime
+import glob
+import multiprocessing
+import os
+
+import cv2
+import pandas as pd
+
+from analisis import DATA_COLUMNS, LeafAnalyzer, settings
+from registro import leaf_filename
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+# Además de las columnas de la sesión, el lote guarda la cobertura de cada deficiencia
+COVERAGE_COLUMNS = [f"Coverage {name}" for name in settings.names]
+BATCH_COLUMNS = DATA_COLUMNS + COVERAGE_COLUMNS
+
+# Devuelve la lista ordenada de imágenes de una carpeta o de un patrón glob
+def collect_images(source, recursive=False):
+    if os.path.isdir(source):
+        pattern = os.path.join(source, '**', '*') if recursive else os.path.join(source, '*')
+    else:
+        pattern = source
+    paths = glob.glob(pattern, recursive=recursive)
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+
+# Inicializa cada proceso: OpenCV no debe abrir sus propios hilos dentro de cada trabajador
+def _init_worker():
+    cv2.setNumThreads(1)
+
+def empty_row(path, reference_area_cm2, researcher):
+    timestamp = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+    row = dict.fromkeys(BATCH_COLUMNS, '-')
+    row.update({'Filename': path, 'Reference Area (cm^2)': reference_area_cm2,
+                'Date': timestamp.strftime('%Y-%m-%d'), 'Time': timestamp.strftime('%H:%M:%S'),
+                'Researcher': researcher})
+    return row
+
+# Agrega a la fila la deficiencia dominante y la cobertura de cada deficiencia
+def add_breakdown(row, breakdown):
+    deficiency = settings.classifier.dominant(breakdown)
+    if deficiency:
+        info = settings.deficiency_info[deficiency]
+        row.update({'Deficiency': deficiency, 'Symptoms': info['symptoms'], 'Treatment': info['treatment']})
+    for name, column in zip(settings.names, COVERAGE_COLUMNS):
+        row[column] = breakdown[name]['coverage']
+    return row
+
+# Analiza una imagen y devuelve una fila con las columnas de BATCH_COLUMNS
+def analyze_image(path, reference_area_cm2=1, researcher='Diego Ramos'):
+    row = empty_row(path, reference_area_cm2, researcher)
+
+    frame = cv2.imread(path)
+    if frame is None:
+        row['Deficiency'] = 'Error: no se pudo leer la imagen'
+        return row
+
+    result = LeafAnalyzer(reference_area_cm2).analyze_image(frame)
+    if not result['reference_detected'] or result['leaf_contour'] is None:
+        row['Deficiency'] = 'Error: no se detectó la referencia' if not result['reference_detected'] else 'Error: no se detectó la hoja'
+        return row
+
+    row.update({'Reference Area (pixels)': result['reference_area_pixels'],
+                'Leaf Area (pixels)': result['leaf_area_pixels'], 'Leaf Area (cm^2)': result['leaf_area_cm2']})
+    return add_breakdown(row, result['breakdown'])
+
+# Analiza todas las hojas de una imagen; devuelve una lista de filas (una por hoja, o una con el error)
+def analyze_image_leaves(path, reference_area_cm2=1, researcher='Diego Ramos'):
+    row = empty_row(path, reference_area_cm2, researcher)
+    frame = cv2.imread(path)
+    if frame is None:
+        row['Deficiency'] = 'Error: no se pudo leer la imagen'
+        return [row]
+
+    result = LeafAnalyzer(reference_area_cm2, multi_leaf=True).analyze_image(frame)
+    if not result['reference_detected']:
+        row['Deficiency'] = 'Error: no se detectó la referencia'
+        return [row]
+    reference_area_pixels = result['reference_area_pixels']
+    leaves = result['leaves']
+    if not leaves:
+        row['Deficiency'] = 'Error: no se detectó la hoja'
+        return [row]
+
+    rows = []
+    for number, leaf in enumerate(leaves, start=1):
+        leaf_row = dict(row, **{'Filename': leaf_filename(path, number), 'Reference Area (pixels)': reference_area_pixels,
+                                'Leaf Area (pixels)': leaf['area_pixels'], 'Leaf Area (cm^2)': leaf['area_cm2']})
+        rows.append(add_breakdown(leaf_row, leaf['breakdown']))
+    return rows
+
+def _analyze_image_args(args):
+    return [analyze_image(*args)]
+
+def _analyze_image_leaves_args(args):
+    return analyze_image_leaves(*args)
+
+# Analiza todas las imágenes en paralelo y devuelve un DataFrame (una fila por imagen, o por hoja con multi_leaf)
+def analyze_batch(paths, workers=None, reference_area_cm2=1, researcher='Diego Ramos', progress=True, multi_leaf=False):
+    workers = workers or os.cpu_count() or 1
+    tasks = [(path, reference_area_cm2, researcher) for path in paths]
+    analyze = _analyze_image_leaves_args if multi_leaf else _analyze_image_args
+    rows = []
+    if workers == 1:
+        for image_rows in map(analyze, tasks):
+            rows.extend(image_rows)
+    else:
+        # Bloques grandes para que el costo de comunicación entre procesos sea despreciable
+        chunksize = max(1, len(tasks) // (workers * 8))
+        with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+            for done, image_rows in enumerate(pool.imap(analyze, tasks, chunksize=chunksize), start=1):
+                rows.extend(image_rows)
+                if progress and done % 100 == 0:
+                    print(f"{done}/{len(tasks)} imágenes procesadas")
+    return pd.DataFrame(rows, columns=BATCH_COLUMNS)
+
+# Guarda la tabla como .xlsx o .csv según la extensión
+def write_results(df, output):
+    if output.lower().endswith('.xlsx'):
+        df.to_excel(output, index=False)
+    else:
+        df.to_csv(output, index=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Análisis por lotes de fotos de hojas (área foliar y deficiencias)")
+    parser.add_argument('source', help="Carpeta con imágenes o patrón glob (p. ej. 'capturas/*.png')")
+    parser.add_argument('-o', '--output', default='resultados_lote.csv', help="Archivo de salida (.csv o .xlsx)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Número de procesos (por defecto, todos los núcleos)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Buscar imágenes también en subcarpetas")
+    parser.add_argument('--reference-cm2', type=float, default=1, help="Área real del cuadro de referencia en cm^2")
+    parser.add_argument('--researcher', default='Diego Ramos')
+    parser.add_argument('--multi', action='store_true', help="Medir todas las hojas de cada foto (una fila por hoja)")
+    args = parser.parse_args(argv)
+
+    paths = collect_images(args.source, args.recursive)
+    if not paths:
+        print("No se encontraron imágenes en", args.source)
+        return 1
+
+    start = datetime.datetime.now()
+    df = analyze_batch(paths, args.workers, args.reference_cm2, args.researcher, multi_leaf=args.multi)
+    write_results(df, args.output)
+    elapsed = (datetime.datetime.now() - start).total_seconds()
+    print(f"{len(paths)} imágenes ({len(df)} filas) analizadas en {elapsed:.1f} s ({len(paths) / max(elapsed, 1e-9):.1f} img/s) -> {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,195 @@
+##Carga del modelo de SisEmbebido.py en segundo plano y con el motor más ligero disponible.
+##Importar TensorFlow y cargar el modelo tarda varios segundos; ModelLoader lo hace en un hilo para que
+##la cámara y la medición del área empiecen de inmediato, y la clasificación se activa cuando el modelo
+##está listo. El motor se elige por la extensión del archivo:
+##  .onnx   -> onnxruntime (pip install onnxruntime)
+##  .tflite -> tflite_runtime (pip install tflite-runtime), o tensorflow.lite si no está
+##  otro    -> Keras (tensorflow.keras.models.load_model), como antes
+##Un modelo de Keras se exporta a TFLite con: python modelo.py model.h5 --export-tflite model.tflite
+##(a ONNX: python -m tf2onnx.convert --keras model.h5 --output model.onnx).
+##
+##Uso: python modelo.py model.onnx  (mide importación, carga y primera inferencia contra el presupuesto)
+
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+class KerasBackend:
+    name = 'keras'
+
+    @staticmethod
+    def import_runtime():
+        from tensorflow.keras.models import load_model
+        return load_model
+
+    def __init__(self, path, runtime):
+        self.model = runtime(path)
+
+    def predict_on_batch(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch))
+
+class OnnxBackend:
+    name = 'onnx'
+
+    @staticmethod
+    def import_runtime():
+        import onnxruntime
+        return onnxruntime
+
+    def __init__(self, path, runtime):
+        self.session = runtime.InferenceSession(path, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict_on_batch(self, batch):
+        return self.session.run(None, {self.input_name: np.asarray(batch, dtype=np.float32)})[0]
+
+class TFLiteBackend:
+    name = 'tflite'
+
+    @staticmethod
+    def import_runtime():
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        return Interpreter
+
+    def __init__(self, path, runtime):
+        self.interpreter = runtime(model_path=path)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+
+    def predict_on_batch(self, batch):
+        batch = np.asarray(batch, dtype=self.input['dtype'])
+        # La entrada exportada suele tener lote 1; se ajusta al tamaño del lote cuando cambia
+        if tuple(self.input['shape']) != batch.shape:
+            self.interpreter.resize_tensor_input(self.input['index'], batch.shape)
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+        self.interpreter.set_tensor(self.input['index'], batch)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output['index'])
+
+BACKENDS = {'.onnx': OnnxBackend, '.tflite': TFLiteBackend}
+
+def backend_for(path):
+    return BACKENDS.get(os.path.splitext(path)[1].lower(), KerasBackend)
+
+class ModelLoader:
+    # path: archivo del modelo (.h5/.keras, .onnx o .tflite)
+    def __init__(self, path):
+        self.path = path
+        self.backend_class = backend_for(path)
+        self.backend = None
+        self.error = None
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.thread = None
+
+    @property
+    def backend_name(self):
+        return self.backend_class.name
+
+    # Carga en segundo plano; regresa enseguida
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.thread = threading.Thread(target=self._load, daemon=True)
+        self.thread.start()
+        return self
+
+    # Carga en el hilo actual (para medir o para programas sin interfaz)
+    def load(self):
+        self.started_at = time.perf_counter()
+        self._load()
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def _load(self):
+        try:
+            start = time.perf_counter()
+            runtime = self.backend_class.import_runtime()
+            self.timings['import_s'] = time.perf_counter() - start
+            start = time.perf_counter()
+            self.backend = self.backend_class(self.path, runtime)
+            self.timings['load_s'] = time.perf_counter() - start
+        except Exception as e:
+            self.error = e
+            print(f"No se pudo cargar el modelo {self.path} ({self.backend_name}):", e)
+        finally:
+            self.timings['ready_s'] = time.perf_counter() - self.started_at
+            self.ready.set()
+
+    # Espera a que el modelo esté cargado; False si se agotó el tiempo o la carga falló
+    def wait(self, timeout=None):
+        return self.ready.wait(timeout) and self.error is None
+
+    # Bloquea hasta que el modelo esté listo (se llama desde el hilo de inferencia, no desde Tk)
+    def predict_on_batch(self, batch):
+        self.ready.wait()
+        if self.error is not None:
+            raise RuntimeError(f"El modelo no está disponible: {self.error}")
+        with self.lock:
+            if 'first_inference_s' not in self.timings:
+                start = time.perf_counter()
+                predictions = self.backend.predict_on_batch(batch)
+                self.timings['first_inference_s'] = time.perf_counter() - start
+                return predictions
+            return self.backend.predict_on_batch(batch)
+
+    def status(self):
+        if not self.ready.is_set():
+            return f"Loading model ({self.backend_name})..."
+        if self.error is not None:
+            return f"Model not available: {self.error}"
+        return f"Model ready ({self.backend_name}, {self.timings['ready_s']:.1f} s)"
+
+def export_tflite(keras_path, tflite_path):
+    import tensorflow as tf
+    model = tf.keras.models.load_model(keras_path)
+    with open(tflite_path, 'wb') as f:
+        f.write(tf.lite.TFLiteConverter.from_keras_model(model).convert())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tiempo de importación, carga y primera inferencia del modelo")
+    parser.add_argument('model')
+    parser.add_argument('--input-size', type=int, default=224)
+    parser.add_argument('--batch', type=int, default=4)
+    parser.add_argument('--import-budget', type=float, default=1.0, help="Segundos máximos para importar el motor")
+    parser.add_argument('--cold-start-budget', type=float, default=3.0, help="Segundos máximos desde el inicio hasta la primera predicción")
+    parser.add_argument('--export-tflite', metavar='SALIDA', help="Exportar un modelo de Keras a TFLite y salir")
+    args = parser.parse_args(argv)
+
+    if args.export_tflite:
+        export_tflite(args.model, args.export_tflite)
+        print("Modelo exportado a", args.export_tflite)
+        return 0
+
+    loader = ModelLoader(args.model).load()
+    batch = np.zeros((args.batch, args.input_size, args.input_size, 3), dtype=np.float32)
+    loader.predict_on_batch(batch)
+    start = time.perf_counter()
+    for _ in range(10):
+        loader.predict_on_batch(batch)
+    warm_ms = (time.perf_counter() - start) / 10 * 1000
+    timings = loader.timings
+    cold_start = timings['ready_s'] + timings['first_inference_s']
+    print(f"motor: {loader.backend_name}")
+    print(f"importación: {timings['import_s']:.2f} s (presupuesto {args.import_budget:.2f} s)")
+    print(f"carga del modelo: {timings['load_s']:.2f} s")
+    print(f"primera inferencia: {timings['first_inference_s'] * 1000:.0f} ms")
+    print(f"arranque en frío: {cold_start:.2f} s (presupuesto {args.cold_start_budget:.2f} s)")
+    print(f"inferencia en caliente: {warm_ms:.1f} ms por lote de {args.batch}")
+    over = timings['import_s'] > args.import_budget or cold_start > args.cold_start_budget
+    if over:
+        print("Fuera de presupuesto")
+    return 1 if over else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
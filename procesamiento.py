@@ -0,0 +1,123 @@
+##Procesamiento de cuadros sin reservar memoria en cada cuadro.
+##FrameProcessor guarda los arreglos intermedios (desenfoque, gris, umbral, bordes, cierre, cuadro
+##reducido, HSV, etiquetas de deficiencias) y se los pasa a OpenCV como destino (dst=) en el cuadro
+##siguiente; sólo se reservan de nuevo si cambia la resolución. Con la cámara a resolución fija, después
+##del primer cuadro el conteo de reservas de stats() deja de crecer.
+##BatchPreprocessor prepara los lotes del modelo de SisEmbebido.py de la misma forma: cada cuadro se
+##reduce en un búfer fijo y se escribe ya normalizado (float32) en su lugar dentro del lote.
+##Un FrameProcessor no es seguro entre hilos: cada hilo de procesamiento usa el suyo, y lo que devuelve
+##(salvo los contornos) se sobrescribe en la siguiente llamada.
+
+import time
+
+import cv2
+import numpy as np
+
+# Núcleo del cierre morfológico de la detección de hojas (se crea una sola vez)
+KERNEL_5X5 = np.ones((5, 5), np.uint8)
+KERNEL_5X5.flags.writeable = False
+
+class FrameProcessor:
+    def __init__(self):
+        self.buffers = {}
+        self.allocations = 0
+        self.frames = 0
+
+    # Guarda la salida de OpenCV como búfer `name`; si OpenCV no pudo escribir en el búfer anterior
+    # (primer cuadro o cambio de resolución) la salida es un arreglo nuevo y se cuenta como reserva
+    def keep(self, name, out):
+        if self.buffers.get(name) is not out:
+            self.buffers[name] = out
+            self.allocations += 1
+        return out
+
+    # Búfer `name` para pasar como dst= (None la primera vez: OpenCV lo reserva)
+    def buffer(self, name):
+        return self.buffers.get(name)
+
+    # Busca la hoja; devuelve el contorno más grande del cuadro o None (mismo resultado que Sistema.find_leaf_contour)
+    def find_leaf_contour(self, frame):
+        self.frames += 1
+        blurred = self.keep('blurred', cv2.GaussianBlur(frame, (5, 5), 0, dst=self.buffer('blurred')))
+        gray = self.keep('gray', cv2.cvtColor(blurred, cv2.COLOR_BGR2GRAY, dst=self.buffer('gray')))
+        _, threshold = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU, dst=self.buffer('threshold'))
+        self.keep('threshold', threshold)
+        edged = self.keep('edged', cv2.Canny(threshold, 50, 150, edges=self.buffer('edged')))
+        morphed = self.keep('morphed', cv2.morphologyEx(edged, cv2.MORPH_CLOSE, KERNEL_5X5, dst=self.buffer('morphed')))
+
+        contours, _ = cv2.findContours(morphed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if contours:
+            return max(contours, key=cv2.contourArea)
+        return None
+
+    # Busca la hoja en el cuadro reducido a `scale`; el contorno se devuelve en coordenadas del cuadro original
+    def find_leaf_contour_scaled(self, frame, scale=1.0):
+        if scale >= 1.0:
+            return self.find_leaf_contour(frame)
+        small = self.keep('small', cv2.resize(frame, None, dst=self.buffer('small'), fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+        contour = self.find_leaf_contour(small)
+        if contour is None:
+            return None
+        return np.round((contour + 0.5) / scale - 0.5).astype(np.int32)
+
+    def hsv(self, frame):
+        return self.keep('hsv', cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=self.buffer('hsv')))
+
+    # Igual que DeficiencyClassifier.label_pixels, con la tabla, los canales y las etiquetas en búferes propios
+    def label_pixels(self, classifier, hsv):
+        looked_up = self.keep('lut', cv2.LUT(hsv, classifier.lut, dst=self.buffer('lut')))
+        channels = [self.keep(f'channel{i}', cv2.extractChannel(looked_up, i, dst=self.buffer(f'channel{i}'))) for i in range(3)]
+        codes = self.keep('codes', cv2.bitwise_and(channels[0], channels[1], dst=self.buffer('codes')))
+        return cv2.bitwise_and(codes, channels[2], dst=codes)
+
+    # Desglose de deficiencias del cuadro completo (o dentro de mask)
+    def breakdown(self, classifier, frame, mask=None):
+        self.frames += 1
+        return classifier.breakdown_codes(self.label_pixels(classifier, self.hsv(frame)), mask)
+
+    # Cuadro en RGB para la interfaz; Image.fromarray copia los datos, así que el búfer se puede reutilizar
+    def rgb(self, frame):
+        return self.keep('rgb', cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.buffer('rgb')))
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'allocations': self.allocations,
+            'buffers': len(self.buffers),
+            'buffer_kib': sum(buffer.nbytes for buffer in self.buffers.values()) / 1024,
+        }
+
+class BatchPreprocessor:
+    # size: lado de la entrada del modelo; batch_size: cuadros por lote (el lote crece si llegan más)
+    # swap_rb: entregar RGB en lugar del BGR de OpenCV (para modelos entrenados con imágenes RGB)
+    def __init__(self, size=224, batch_size=4, swap_rb=False, scale=1 / 255):
+        self.size = size
+        self.swap_rb = swap_rb
+        self.scale = np.float32(scale)
+        self.resized = np.empty((size, size, 3), np.uint8)
+        self.batch = np.empty((batch_size, size, size, 3), np.float32)
+        self.allocations = 2
+        self.frames = 0
+        self.seconds = 0.0
+
+    # Lote (n, size, size, 3) float32 con los cuadros reducidos y normalizados. Es una vista del búfer
+    # interno: el modelo debe usarlo antes de la siguiente llamada (InferenceService lo hace así).
+    def __call__(self, frames):
+        start = time.perf_counter()
+        if len(frames) > len(self.batch):
+            self.batch = np.empty((len(frames), self.size, self.size, 3), np.float32)
+            self.allocations += 1
+        for slot, frame in zip(self.batch, frames):
+            resized = cv2.resize(frame, (self.size, self.size), dst=self.resized)
+            # Cambio de canales y normalización en una sola pasada, escribiendo directo en el lote
+            np.multiply(resized[..., ::-1] if self.swap_rb else resized, self.scale, out=slot, dtype=np.float32)
+        self.frames += len(frames)
+        self.seconds += time.perf_counter() - start
+        return self.batch[:len(frames)]
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'allocations': self.allocations,
+            'preprocess_ms_mean': self.seconds / self.frames * 1000 if self.frames else None,
+        }
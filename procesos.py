@@ -0,0 +1,188 @@
+##Análisis de cuadros en varios procesos, para usar todos los núcleos de la computadora de captura.
+##Los cuadros no se serializan: el proceso principal los copia a un anillo de búferes en memoria
+##compartida (multiprocessing.shared_memory) y a cada trabajador sólo le envía el número de búfer, la
+##forma y si se está capturando. El trabajador analiza el cuadro con su propio LeafAnalyzer
+##(analisis.py, sin tkinter) y devuelve el resultado compacto (contornos, áreas, desglose, tiempos).
+##El búfer vuelve a quedar libre cuando llega el resultado.
+##
+##La referencia se sigue en el proceso principal, con un solo ReferenceTracker para todos los cuadros (es
+##una región pequeña), y viaja con cada cuadro: así la estimación no salta según el trabajador que lo analiza.
+##
+##Los trabajadores se crean con spawn (también en Linux). El punto de entrada (_worker_loop) está en este
+##módulo, pero spawn también vuelve a importar el script principal en cada trabajador, como __mp_main__:
+##el script no debe hacer nada al importarse (cámara, ventana, puerto serie); todo eso va bajo
+##if __name__ == "__main__", como en Sistema.py.
+
+import concurrent.futures
+import itertools
+import multiprocessing
+import queue
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+class SharedFrameRing:
+    # slots búferes de slot_bytes bytes cada uno en un solo bloque de memoria compartida
+    def __init__(self, slots, slot_bytes, name=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    # Arreglo sobre el búfer `slot` (sin copiar)
+    def view(self, slot, shape, dtype=np.uint8):
+        return np.ndarray(shape, dtype, buffer=self.memory.buf, offset=slot * self.slot_bytes)
+
+    def write(self, slot, frame):
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"El cuadro ({frame.nbytes} bytes) no cabe en el búfer compartido ({self.slot_bytes} bytes)")
+        np.copyto(self.view(slot, frame.shape, frame.dtype), frame)
+
+    def close(self):
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+def _worker_loop(ring_name, slots, slot_bytes, tasks, results, analyzer_options):
+    import cv2
+    from analisis import LeafAnalyzer, settings
+    # Un hilo de OpenCV por proceso: el paralelismo lo dan los procesos
+    cv2.setNumThreads(1)
+    ring = SharedFrameRing(slots, slot_bytes, ring_name)
+    analyzer = LeafAnalyzer(**analyzer_options)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            task_id, slot, shape, dtype, capturing, reference = task
+            try:
+                # Rangos de color nuevos si cambió la calibración (como en el proceso principal)
+                settings.maybe_reload()
+                result = analyzer.analyze(ring.view(slot, shape, dtype), capturing, reference)
+                results.put((task_id, slot, result, None))
+            except Exception as e:
+                results.put((task_id, slot, None, repr(e)))
+    finally:
+        analyzer = None
+        ring.close()
+
+class ProcessAnalysisPool:
+    # workers: procesos de análisis; slots: búferes del anillo (por omisión, dos por trabajador)
+    # analyzer_options: argumentos de LeafAnalyzer en cada trabajador (reference_area_cm2, multi_leaf, ...)
+    # El anillo se crea con el primer cuadro, del tamaño de ese cuadro (la cámara no cambia de resolución).
+    def __init__(self, workers=None, slots=None, **analyzer_options):
+        self.workers = workers or multiprocessing.cpu_count() or 1
+        self.slots = slots or 2 * self.workers
+        self.analyzer_options = analyzer_options
+        # Sólo para seguir la referencia en este proceso (track_reference); el análisis se hace en los trabajadores
+        self.reference_analyzer = None
+        self.reference_lock = threading.Lock()
+        self.ring = None
+        self.processes = []
+        self.free_slots = queue.Queue()
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.task_ids = itertools.count(1)
+        self.submitted = 0
+        self.completed = 0
+        self.errors = 0
+        self.collector = None
+        self.start_lock = threading.Lock()
+
+    def start(self, frame_shape, dtype=np.uint8):
+        # spawn también en Linux: el proceso principal ya tiene hilos (cámara, Tk) y fork sólo copiaría el actual
+        context = multiprocessing.get_context('spawn')
+        from analisis import LeafAnalyzer
+        self.reference_analyzer = LeafAnalyzer(**self.analyzer_options)
+        self.ring = SharedFrameRing(self.slots, int(np.prod(frame_shape)) * np.dtype(dtype).itemsize)
+        for slot in range(self.slots):
+            self.free_slots.put(slot)
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.processes = [context.Process(target=_worker_loop, daemon=True,
+                                          args=(self.ring.name, self.slots, self.ring.slot_bytes, self.tasks, self.results, self.analyzer_options))
+                          for _ in range(self.workers)]
+        for process in self.processes:
+            process.start()
+        self.collector = threading.Thread(target=self._collect_loop, daemon=True)
+        self.collector.start()
+        return self
+
+    # Copia el cuadro a un búfer libre (espera si todos están ocupados) y lo encola; devuelve un Future con el resultado
+    def submit(self, frame, capturing=False, timeout=None):
+        with self.start_lock:
+            if self.ring is None:
+                self.start(frame.shape, frame.dtype)
+        slot = self.free_slots.get(timeout=timeout)
+        try:
+            with self.reference_lock:
+                reference = self.reference_analyzer.track_reference(frame)
+            self.ring.write(slot, frame)
+        except Exception:
+            self.free_slots.put(slot)
+            raise
+        future = concurrent.futures.Future()
+        task_id = next(self.task_ids)
+        with self.lock:
+            self.futures[task_id] = future
+            self.submitted += 1
+        self.tasks.put((task_id, slot, frame.shape, frame.dtype.str, capturing, reference))
+        return future
+
+    # Igual que LeafAnalyzer.analyze, pero en un trabajador. Varios hilos pueden llamarlo a la vez.
+    def analyze(self, frame, capturing=False, timeout=5.0):
+        return self.submit(frame, capturing, timeout).result(timeout)
+
+    def _collect_loop(self):
+        while True:
+            item = self.results.get()
+            if item is None:
+                break
+            task_id, slot, result, error = item
+            self.free_slots.put(slot)
+            with self.lock:
+                future = self.futures.pop(task_id, None)
+                self.completed += 1
+                if error is not None:
+                    self.errors += 1
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(RuntimeError(f"Error en el trabajador: {error}"))
+            else:
+                future.set_result(result)
+
+    def close(self, timeout=2.0):
+        if self.ring is None:
+            return
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.results.put(None)
+        self.collector.join(timeout)
+        self.ring.close()
+        self.ring = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'slots': self.slots,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'in_flight': len(self.futures),
+                'errors': self.errors,
+            }
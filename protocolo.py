@@ -0,0 +1,79 @@
+##Protocolo binario de resultados para el enlace serie con el Arduino.
+##En lugar de enviar los párrafos de síntomas y tratamiento (cientos de bytes a 9600 baudios), cada hoja
+##viaja en una trama de 11 bytes (~11 ms a 9600 baudios); los textos se quedan en la computadora.
+##
+##  byte 0-1  0xAA 0x55          sincronía
+##  byte 2    tipo               MSG_RESULT
+##  byte 3-4  secuencia          uint16, little-endian
+##  byte 5    código             0 = hoja sana, 1..N = deficiencia (orden de deficiency_info), 0xFD-0xFF errores
+##  byte 6-7  cobertura          uint16, centésimas de porcentaje (0-10000)
+##  byte 8-9  área de la hoja    uint16, décimas de cm^2 (0 si no se midió)
+##  byte 10   CRC-8              polinomio 0x07, valor inicial 0, sobre los bytes 2-9
+
+import struct
+
+SYNC = b'\xaa\x55'
+MSG_RESULT = 0x01
+PAYLOAD = struct.Struct('<BHBHH')
+FRAME_SIZE = len(SYNC) + PAYLOAD.size + 1
+
+CODE_HEALTHY = 0x00
+CODE_CAPTURE_ERROR = 0xFD
+CODE_NO_LEAF = 0xFE
+CODE_NO_REFERENCE = 0xFF
+
+def _crc8_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return table
+
+CRC8_TABLE = _crc8_table()
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+# Códigos de deficiencia en el orden de deficiency_info: {nombre: código}
+def deficiency_codes(deficiency_info):
+    return {name: code for code, name in enumerate(deficiency_info, start=1)}
+
+def encode_result(sequence, code, coverage=0.0, leaf_area_cm2=None):
+    coverage = min(max(int(round(coverage * 10000)), 0), 10000)
+    area = min(max(int(round((leaf_area_cm2 or 0) * 10)), 0), 0xFFFF)
+    payload = PAYLOAD.pack(MSG_RESULT, sequence & 0xFFFF, code, coverage, area)
+    return SYNC + payload + bytes([crc8(payload)])
+
+# Decodificador por flujo: se le pasan los bytes según llegan y devuelve las tramas completas válidas.
+# Las tramas con CRC incorrecto se descartan y se busca la siguiente sincronía.
+class FrameDecoder:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.errors = 0
+
+    def feed(self, data):
+        self.buffer += data
+        messages = []
+        while True:
+            start = self.buffer.find(SYNC)
+            if start < 0:
+                # Se conserva el último byte por si es la primera mitad de la sincronía
+                del self.buffer[:max(0, len(self.buffer) - 1)]
+                return messages
+            del self.buffer[:start]
+            if len(self.buffer) < FRAME_SIZE:
+                return messages
+            payload = bytes(self.buffer[len(SYNC):len(SYNC) + PAYLOAD.size])
+            if crc8(payload) != self.buffer[FRAME_SIZE - 1]:
+                self.errors += 1
+                del self.buffer[:1]
+                continue
+            del self.buffer[:FRAME_SIZE]
+            kind, sequence, code, coverage, area = PAYLOAD.unpack(payload)
+            messages.append({'type': kind, 'sequence': sequence, 'code': code,
+                             'coverage': coverage / 10000, 'leaf_area_cm2': area / 10})
@@ -0,0 +1,139 @@
+##Medición del cuadro de referencia de 1 cm^2.
+##ReferenceTracker vuelve a medir el cuadro cada cierto número de cuadros (no sólo la primera vez),
+##descarta mediciones atípicas, mantiene la mediana de las últimas mediciones como estimación y
+##no repite el umbral ni la búsqueda de contornos si la región de referencia no cambió con respecto a la
+##última medición aceptada (aun así, mide de nuevo cada max_skipped revisiones, y siempre mientras haya
+##mediciones descartadas, para volver a fijar la referencia si la cámara se movió).
+
+import collections
+
+import cv2
+import numpy as np
+
+# Límites (arriba, abajo, izquierda, derecha) de la región del cuadro de referencia
+def reference_bounds(frame):
+    frame_height = frame.shape[0]
+    return frame_height - 150, frame_height - 50, 50, 150
+
+# Región donde se coloca el cuadro de referencia de 1 cm^2 (esquina inferior izquierda)
+def reference_roi(frame):
+    top, bottom, left, right = reference_bounds(frame)
+    return frame[top:bottom, left:right]
+
+# Busca el cuadro de referencia; devuelve su contorno (en coordenadas de la ROI) o None
+# threshold: gris máximo del cuadro (negro); min_area: área mínima en píxeles
+def find_reference_contour(frame, gray=None, threshold=50, min_area=100):
+    if gray is None:
+        gray = cv2.cvtColor(reference_roi(frame), cv2.COLOR_BGR2GRAY)
+    _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY_INV)
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if contours:
+        max_contour = max(contours, key=cv2.contourArea)
+        if cv2.contourArea(max_contour) > min_area:
+            return max_contour
+    return None
+
+class ReferenceTracker:
+    # interval: cada cuántos cuadros se vuelve a medir
+    # window: cuántas mediciones aceptadas se usan para la mediana
+    # tolerance: diferencia relativa máxima con la mediana para aceptar una medición
+    # roi_change: diferencia media de gris (0-255) a partir de la cual la región se considera cambiada
+    # max_skipped: revisiones seguidas sin cambios tras las cuales se mide de todos modos
+    # threshold, min_area: los de find_reference_contour
+    def __init__(self, interval=15, window=15, tolerance=0.1, roi_change=2.0, max_skipped=4, threshold=50, min_area=100):
+        self.interval = interval
+        self.threshold = threshold
+        self.min_area = min_area
+        self.tolerance = tolerance
+        self.roi_change = roi_change
+        self.max_skipped = max_skipped
+        self.samples = collections.deque(maxlen=window)
+        self.rejected = collections.deque(maxlen=window)
+        # Resultado de las últimas revisiones (medidas o no): True si coincidieron con la estimación
+        self.checks = collections.deque(maxlen=window)
+        # Región de la última medición aceptada
+        self.accepted_gray = None
+        self.contour = None
+        self.last_area = None
+        self.frames_since_check = interval
+        self.skipped_in_row = 0
+        self.measurements = 0
+        self.skipped = 0
+
+    @property
+    def area(self):
+        return float(np.median(self.samples)) if self.samples else None
+
+    # 0 sin mediciones; 1 cuando las últimas `window` revisiones coinciden con la estimación
+    # (una región sin cambios cuenta como coincidencia) y las mediciones son consistentes entre sí
+    @property
+    def confidence(self):
+        if not self.samples:
+            return 0.0
+        samples = np.array(self.samples)
+        median = np.median(samples)
+        spread = np.median(np.abs(samples - median)) / median
+        return float(sum(self.checks) / self.checks.maxlen * max(0.0, 1 - spread / self.tolerance))
+
+    def reset(self):
+        self.samples.clear()
+        self.rejected.clear()
+        self.checks.clear()
+        self.accepted_gray = None
+        self.contour = None
+        self.last_area = None
+        self.frames_since_check = self.interval
+        self.skipped_in_row = 0
+
+    # La región es la de la última medición aceptada: la medición daría lo mismo
+    def _unchanged(self, gray):
+        if self.rejected or self.accepted_gray is None or self.accepted_gray.shape != gray.shape:
+            return False
+        if self.skipped_in_row >= self.max_skipped:
+            return False
+        return cv2.norm(gray, self.accepted_gray, cv2.NORM_L1) / gray.size < self.roi_change
+
+    # Devuelve (contorno, detectado). Entre mediciones se reutiliza el último contorno.
+    def update(self, frame):
+        self.frames_since_check += 1
+        if self.samples and self.frames_since_check < self.interval:
+            return self.contour, self.contour is not None
+        self.frames_since_check = 0
+
+        gray = cv2.cvtColor(reference_roi(frame), cv2.COLOR_BGR2GRAY)
+        if self._unchanged(gray):
+            # Se reutiliza el contorno sin recalcular. No se agrega como muestra (repetir la misma
+            # medición no la hace más precisa), pero sí cuenta como revisión que coincide
+            self.skipped += 1
+            self.skipped_in_row += 1
+            self.checks.append(True)
+            return self.contour, self.contour is not None
+        self.skipped_in_row = 0
+
+        self.measurements += 1
+        self.contour = find_reference_contour(frame, gray, self.threshold, self.min_area)
+        self.last_area = cv2.contourArea(self.contour) if self.contour is not None else None
+        accepted = self.last_area is not None and self.add_sample(self.last_area)
+        if accepted:
+            self.accepted_gray = gray
+        self.checks.append(accepted)
+        return self.contour, self.contour is not None
+
+    # True si la medición quedó en la estimación (coincide con ella, o la reemplazó porque la cámara se movió)
+    def add_sample(self, area):
+        median = self.area
+        if median is None or abs(area - median) / median <= self.tolerance:
+            self.samples.append(area)
+            self.rejected.clear()
+            return True
+        # Si la mayoría de las mediciones recientes difieren de la estimación, la cámara se movió:
+        # se adopta el nuevo valor en lugar de seguir descartándolo
+        self.rejected.append(area)
+        if len(self.rejected) > self.samples.maxlen // 2:
+            new_samples = list(self.rejected)
+            self.samples.clear()
+            self.rejected.clear()
+            self.checks.clear()
+            self.samples.extend(new_samples)
+            return True
+        return False
@@ -0,0 +1,73 @@
+##Registro de resultados de una sesión: un CSV al que sólo se le agregan filas.
+##Cada captura cuesta una escritura de una línea (O(1)); el Excel se genera sólo al exportar.
+##Además mantiene en memoria un índice Filename -> fila para consultar metadatos sin leer el archivo.
+##Cuando una imagen tiene varias hojas, cada hoja es una fila con Filename "<imagen>#<número>".
+
+import csv
+import os
+
+import pandas as pd
+
+LEAF_SEPARATOR = '#'
+
+def leaf_filename(filename, number):
+    return f"{filename}{LEAF_SEPARATOR}{number}"
+
+class ResultsStore:
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.index = {}
+        if os.path.exists(path):
+            # El archivo sólo se lee una vez, al abrir la sesión
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                for row in reader:
+                    self.index[row[0]] = row
+        else:
+            # utf-8-sig para que Excel abra bien los acentos del CSV
+            with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+                csv.writer(f).writerow(self.columns)
+
+    @property
+    def count(self):
+        return len(self.index)
+
+    # row: lista en el orden de columns
+    def append(self, row):
+        with open(self.path, 'a', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerow(row)
+        # Se guarda como texto, igual que queda en el CSV
+        self.index[str(row[0])] = ['' if value is None else str(value) for value in row]
+
+    # Fila (lista en el orden de columns) de una imagen, o None si no está registrada
+    def lookup(self, filename):
+        return self.index.get(filename)
+
+    # Filas de una imagen: la suya, o las de cada hoja si se registró con varias hojas
+    def lookup_all(self, filename):
+        row = self.index.get(filename)
+        if row is not None:
+            return [row]
+        rows = []
+        while True:
+            row = self.index.get(leaf_filename(filename, len(rows) + 1))
+            if row is None:
+                return rows
+            rows.append(row)
+
+    # Todas las filas registradas como DataFrame, sin volver a leer el archivo
+    def dataframe(self):
+        return pd.DataFrame(list(self.index.values()), columns=self.columns)
+
+    def read(self):
+        return pd.read_csv(self.path, encoding='utf-8-sig')
+
+    # Se llama al renombrar la carpeta de la sesión
+    def move(self, new_path):
+        self.path = new_path
+
+    def export_excel(self, filename):
+        self.read().to_excel(filename, index=False)
+        return filename
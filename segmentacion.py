@@ -0,0 +1,92 @@
+##Detección de varias hojas en un mismo cuadro (p. ej. una charola con diez hojas).
+##La máscara de hojas se etiqueta con componentes conexas: una sola pasada da el área, el recuadro y
+##el centro de cada hoja, y el desglose de deficiencias de todas las hojas sale de un solo histograma
+##por (etiqueta, código de deficiencias), sin recorrer los contornos uno por uno en Python.
+
+import cv2
+import numpy as np
+
+from referencia import reference_bounds
+
+# Máscara binaria de las hojas (oscuras sobre fondo claro) con los huecos rellenos: las manchas claras
+# de una deficiencia quedan dentro de la hoja igual que con el contorno externo de find_leaf_contour
+def leaves_mask(frame):
+    blurred = cv2.GaussianBlur(frame, (5, 5), 0)
+    gray = cv2.cvtColor(blurred, cv2.COLOR_BGR2GRAY)
+    _, mask = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8))
+
+    # Lo que no se alcanza rellenando el fondo desde el borde es un hueco dentro de una hoja
+    background = np.pad(mask, 1)
+    cv2.floodFill(background, None, (0, 0), 255)
+    return cv2.bitwise_or(mask, cv2.bitwise_not(background[1:-1, 1:-1]))
+
+# Etiqueta las hojas; devuelve (etiquetas, índices de las componentes que son hojas, stats, centros).
+# Se descartan las componentes menores que min_area y las que caen dentro de la región de referencia.
+def label_leaves(frame, min_area=1000):
+    count, labels, stats, centroids = cv2.connectedComponentsWithStats(leaves_mask(frame), connectivity=8)
+    ref_top, ref_bottom, ref_left, ref_right = reference_bounds(frame)
+    x, y, w, h, area = (stats[:, i] for i in range(5))
+    inside_reference = (x >= ref_left) & (x + w <= ref_right) & (y >= ref_top) & (y + h <= ref_bottom)
+    keep = (area >= min_area) & ~inside_reference
+    keep[0] = False  # la etiqueta 0 es el fondo
+    return labels, np.flatnonzero(keep), stats, centroids
+
+# Desglose de deficiencias de cada etiqueta en una sola pasada: {etiqueta: {nombre: {'pixels', 'coverage'}}}
+def breakdown_by_label(classifier, hsv, labels, leaf_labels):
+    codes = classifier.label_pixels(hsv)
+    code_count = len(classifier.membership)
+    # Cada hoja pasa a una fila 1..n del histograma; el fondo y lo descartado (fila 0) no se cuentan
+    row_of_label = np.zeros(labels.max() + 1, dtype=np.int32)
+    row_of_label[leaf_labels] = np.arange(1, len(leaf_labels) + 1)
+    rows = row_of_label[labels]
+    on_leaf = rows > 0
+    index = rows[on_leaf] * code_count + codes[on_leaf]
+    hist = np.bincount(index, minlength=(len(leaf_labels) + 1) * code_count)
+    hist = hist.reshape(len(leaf_labels) + 1, code_count)[1:]
+    totals = hist.sum(axis=1)
+    counts = hist @ classifier.membership
+    return {int(label): {name: {'pixels': int(count), 'coverage': count / total if total else 0.0}
+                         for name, count in zip(classifier.names, leaf_counts)}
+            for label, leaf_counts, total in zip(leaf_labels, counts, totals)}
+
+# Mide todas las hojas del cuadro. Devuelve una lista (de izquierda a derecha y de arriba abajo) de
+# diccionarios con label, bbox (x, y, w, h), centroid, area_pixels, area_cm2 (None sin referencia),
+# breakdown y deficiency (la dominante o None; ambos None si no se pasa un clasificador, p. ej. en la vista previa).
+def measure_leaves(frame, classifier=None, reference_area_pixels=None, reference_area_cm2=1, min_area=1000):
+    labels, leaf_labels, stats, centroids = label_leaves(frame, min_area)
+    if len(leaf_labels) == 0:
+        return []
+    breakdowns = {}
+    if classifier is not None:
+        breakdowns = breakdown_by_label(classifier, cv2.cvtColor(frame, cv2.COLOR_BGR2HSV), labels, leaf_labels)
+    # Orden de lectura: por filas (con tolerancia de media altura de hoja) y luego por columna
+    row_height = max(1, int(np.median(stats[leaf_labels, cv2.CC_STAT_HEIGHT])) // 2)
+    order = sorted(leaf_labels, key=lambda label: (int(centroids[label][1]) // row_height, centroids[label][0]))
+    leaves = []
+    for label in order:
+        x, y, w, h, area = (int(v) for v in stats[label])
+        breakdown = breakdowns.get(int(label))
+        leaves.append({
+            'label': int(label),
+            'bbox': (x, y, w, h),
+            'centroid': (float(centroids[label][0]), float(centroids[label][1])),
+            'area_pixels': area,
+            'breakdown': breakdown,
+            'deficiency': classifier.dominant(breakdown) if breakdown is not None else None,
+        })
+    return set_reference(leaves, reference_area_pixels, reference_area_cm2)
+
+# Calcula (o recalcula) el área en cm^2 de cada hoja con el área de referencia
+def set_reference(leaves, reference_area_pixels, reference_area_cm2=1):
+    for leaf in leaves:
+        leaf['area_cm2'] = leaf['area_pixels'] / reference_area_pixels * reference_area_cm2 if reference_area_pixels else None
+    return leaves
+
+# Dibuja el recuadro y el número de cada hoja
+def draw_leaves(frame, leaves):
+    for number, leaf in enumerate(leaves, start=1):
+        x, y, w, h = leaf['bbox']
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        cv2.putText(frame, str(number), (x + 5, y + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+    return frame
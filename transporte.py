@@ -0,0 +1,233 @@
+##Transporte serie intercambiable para hablar con el Arduino.
+##Todas las variantes ofrecen write(data), read(size), readline() y close(). Las lecturas esperan
+##bloqueadas (con tiempo límite) en lugar de consultar in_waiting en un ciclo, así que el programa
+##no consume CPU mientras no llegan datos. Leer de un transporte cerrado lanza TransportClosed (un OSError,
+##como el error de pySerial con el puerto cerrado), para que los ciclos de lectura terminen en lugar de girar.
+##
+##  open_transport('COM4') / '/dev/ttyUSB0'  -> puerto real con pySerial
+##  open_transport('loop://')                -> eco en el mismo proceso (lo escrito se vuelve a leer)
+##  open_transport('sim://?interval=0.5')    -> Arduino simulado en el mismo proceso que envía 'e' periódicamente
+##  pty_device()                             -> dispositivo falso en un pseudo-terminal (Linux), para probar
+##                                              el programa completo abriendo un puerto "real"
+
+import os
+import select
+import threading
+import time
+import urllib.parse
+
+class TransportClosed(OSError):
+    pass
+
+class SerialTransport:
+    # reset_delay: tiempo que tarda el Arduino en reiniciarse al conectarse. No se espera al abrir:
+    # la primera escritura espera lo que falte, así el programa sigue iniciando (cámara, interfaz) mientras tanto
+    def __init__(self, port, baudrate=9600, timeout=1.0, reset_delay=0):
+        import serial
+        self.serial = serial.Serial(port, baudrate, timeout=timeout)
+        self.timeout = timeout
+        self.ready_at = time.monotonic() + reset_delay
+
+    def wait_ready(self):
+        remaining = self.ready_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def write(self, data):
+        self.wait_ready()
+        return self.serial.write(data)
+
+    def read(self, size=1):
+        return self.serial.read(size)
+
+    def readline(self):
+        return self.serial.readline()
+
+    @property
+    def in_waiting(self):
+        return self.serial.in_waiting
+
+    def close(self):
+        self.serial.close()
+
+class LoopbackTransport:
+    # Un extremo de un canal en memoria; lo que se escribe en un extremo se lee en el otro
+    def __init__(self, timeout=1.0):
+        self.timeout = timeout
+        self.buffer = bytearray()
+        self.condition = threading.Condition()
+        self.peer = self
+        self.closed = False
+
+    @classmethod
+    def pair(cls, timeout=1.0):
+        host, device = cls(timeout), cls(timeout)
+        host.peer, device.peer = device, host
+        return host, device
+
+    def _receive(self, data):
+        with self.condition:
+            self.buffer += data
+            self.condition.notify_all()
+
+    def write(self, data):
+        if self.closed:
+            raise TransportClosed("El transporte está cerrado")
+        self.peer._receive(bytes(data))
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        with self.condition:
+            return len(self.buffer)
+
+    def read(self, size=1):
+        with self.condition:
+            self.condition.wait_for(lambda: self.buffer or self.closed, self.timeout)
+            if self.closed and not self.buffer:
+                raise TransportClosed("El transporte está cerrado")
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            return data
+
+    # Como pySerial: si se agota el tiempo devuelve lo que haya llegado (puede ser b'')
+    def readline(self):
+        with self.condition:
+            self.condition.wait_for(lambda: b'\n' in self.buffer or self.closed, self.timeout)
+            if self.closed and not self.buffer:
+                raise TransportClosed("El transporte está cerrado")
+            end = self.buffer.find(b'\n') + 1 or len(self.buffer)
+            data = bytes(self.buffer[:end])
+            del self.buffer[:end]
+            return data
+
+    def close(self):
+        for end in (self, self.peer):
+            with end.condition:
+                end.closed = True
+                end.condition.notify_all()
+
+class FdTransport:
+    # Transporte sobre un descriptor de archivo (el lado maestro de un pseudo-terminal)
+    def __init__(self, fd, timeout=1.0):
+        self.fd = fd
+        self.timeout = timeout
+        self.pending = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        return os.write(self.fd, data)
+
+    # False si se agotó el tiempo; TransportClosed si se cerró o el otro extremo colgó (EIO o fin de archivo)
+    def _fill(self, deadline):
+        if self.closed:
+            raise TransportClosed("El transporte está cerrado")
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        ready, _, _ = select.select([self.fd], [], [], remaining)
+        if not ready:
+            return False
+        try:
+            chunk = os.read(self.fd, 4096)
+        except OSError as e:
+            raise TransportClosed(f"El otro extremo se cerró: {e}") from e
+        if not chunk:
+            raise TransportClosed("El otro extremo se cerró")
+        self.pending += chunk
+        return True
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        if not self.pending:
+            self._fill(deadline)
+        data = bytes(self.pending[:size])
+        del self.pending[:size]
+        return data
+
+    def readline(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while b'\n' not in self.pending:
+            if not self._fill(deadline):
+                break
+        end = self.pending.find(b'\n') + 1 or len(self.pending)
+        data = bytes(self.pending[:end])
+        del self.pending[:end]
+        return data
+
+    def close(self):
+        self.closed = True
+        os.close(self.fd)
+
+class SimulatedArduino:
+    # Imita la placa: envía el disparador cada `interval` segundos (count veces, o sin fin si es None)
+    # y guarda lo que responde el programa, con la latencia desde el disparo hasta el primer byte
+    def __init__(self, transport, trigger=b'e', interval=1.0, count=None):
+        self.transport = transport
+        self.trigger = trigger
+        self.interval = interval
+        self.count = count
+        self.responses = []
+        self.latencies = []
+        self.sent = 0
+        self.running = False
+        self.last_trigger = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.running = True
+        self.threads = [threading.Thread(target=self._trigger_loop, daemon=True),
+                        threading.Thread(target=self._read_loop, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+
+    # El primer disparo también espera un intervalo, para dar tiempo a que el programa abra el puerto
+    def _trigger_loop(self):
+        while self.running and (self.count is None or self.sent < self.count):
+            time.sleep(self.interval)
+            with self.lock:
+                self.last_trigger = time.perf_counter()
+                self.sent += 1
+            try:
+                self.transport.write(self.trigger + b'\n')
+            except OSError:
+                break
+
+    def _read_loop(self):
+        while self.running:
+            try:
+                data = self.transport.read(4096)
+            except OSError:
+                # Transporte cerrado: el simulador deja de escuchar
+                break
+            if not data:
+                continue
+            with self.lock:
+                if self.last_trigger is not None:
+                    self.latencies.append(time.perf_counter() - self.last_trigger)
+                    self.last_trigger = None
+                self.responses.append(data)
+
+# Crea un pseudo-terminal con un Arduino simulado en el lado maestro. Devuelve (ruta_del_puerto, simulador);
+# el programa abre la ruta como si fuera un puerto serie real. Sólo en Linux/macOS.
+def pty_device(trigger=b'e', interval=1.0, count=None):
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    simulator = SimulatedArduino(FdTransport(master, timeout=0.5), trigger, interval, count).start()
+    return os.ttyname(slave), simulator
+
+# Abre un transporte a partir de una cadena: nombre de puerto, 'loop://' o 'sim://?interval=1&trigger=e&count=10'
+def open_transport(spec, baudrate=9600, timeout=1.0, reset_delay=0):
+    if spec.startswith('loop://'):
+        return LoopbackTransport(timeout)
+    if spec.startswith('sim://'):
+        options = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(spec).query))
+        host, device = LoopbackTransport.pair(timeout)
+        count = options.get('count')
+        host.simulator = SimulatedArduino(device, options.get('trigger', 'e').encode(), float(options.get('interval', 1.0)),
+                                          int(count) if count else None).start()
+        return host
+    return SerialTransport(spec, baudrate, timeout, reset_delay)
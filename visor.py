@@ -0,0 +1,94 @@
+##Caché de imágenes para el visor de capturas.
+##Guarda las imágenes ya decodificadas y sus versiones redimensionadas por nivel de zoom en una LRU
+##acotada en bytes, para que acercar/alejar no vuelva a leer el PNG del disco. Para alejar se parte
+##de una pirámide de mitades (1, 1/2, 1/4, ...) y se redimensiona desde el nivel más cercano.
+##Las claves son (ruta, tipo, valor): ('original', 1), ('pyramid', nivel) o ('zoom', zoom), así un nivel de la
+##pirámide no se confunde con un zoom del mismo valor. Al mover, renombrar o borrar archivos, la interfaz
+##descarta sus entradas (discard / discard_folder).
+
+import collections
+import os
+
+from PIL import Image
+
+def image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+class ImageCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        image = self.entries.get(key)
+        if image is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return image
+
+    def _put(self, key, image):
+        if key in self.entries:
+            self.size -= image_bytes(self.entries.pop(key))
+        self.entries[key] = image
+        self.size += image_bytes(image)
+        # La entrada recién agregada nunca se descarta, aunque sola exceda el límite
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= image_bytes(evicted)
+
+    # Permite entregar al visor una imagen que ya está en memoria (p. ej. recién capturada)
+    def put(self, path, image):
+        self._put((os.path.abspath(path), 'original', 1), image)
+
+    def original(self, path):
+        key = (os.path.abspath(path), 'original', 1)
+        image = self._get(key)
+        if image is None:
+            image = Image.open(path)
+            image.load()
+            self._put(key, image)
+        return image
+
+    # Nivel de la pirámide 1/2**level, generado a partir del nivel anterior
+    def _pyramid_level(self, path, level):
+        if level == 0:
+            return self.original(path)
+        key = (os.path.abspath(path), 'pyramid', level)
+        image = self._get(key)
+        if image is None:
+            image = self._pyramid_level(path, level - 1).reduce(2)
+            self._put(key, image)
+        return image
+
+    def scaled(self, path, zoom):
+        zoom = round(zoom, 4)
+        if zoom == 1.0:
+            return self.original(path)
+        key = (os.path.abspath(path), 'zoom', zoom)
+        image = self._get(key)
+        if image is None:
+            level = 0
+            while zoom <= 0.5 ** (level + 1):
+                level += 1
+            source = self._pyramid_level(path, level)
+            original = self.original(path)
+            size = (max(1, int(original.width * zoom)), max(1, int(original.height * zoom)))
+            image = source.resize(size, Image.LANCZOS)
+            self._put(key, image)
+        return image
+
+    def discard(self, path):
+        path = os.path.abspath(path)
+        for key in [key for key in self.entries if key[0] == path]:
+            self.size -= image_bytes(self.entries.pop(key))
+
+    # Todas las imágenes dentro de una carpeta (al renombrar o borrar una sesión)
+    def discard_folder(self, folder):
+        prefix = os.path.join(os.path.abspath(folder), '')
+        for key in [key for key in self.entries if key[0].startswith(prefix)]:
+            self.size -= image_bytes(self.entries.pop(key))